@@ -0,0 +1,418 @@
+"""
+Benchmarks reprodutíveis dos caminhos críticos do gerador de proxies.
+
+Gera um corpus sintético de cartas (tamanhos, mistura JPEG/PNG, com/sem alfa e
+proporção de duplicadas configuráveis, sempre com a mesma semente) e mede:
+  - redimensionar_manter_proporcao e process_image (latência por imagem);
+  - converter_para_63x88_mm com vários números de workers;
+  - criar_pdf_com_cartas com 9, 90 e 900 cartas, e a reconstrução incremental
+    depois de trocar algumas cartas do deck;
+  - a busca em massa (buscar_carta + buscar_prints) contra o servidor local
+    fake_scryfall (modo sintético, com latência e falhas opcionais);
+  - o tempo de importação de cada módulo (e se ele cria arquivos ao ser importado)
+    e o tempo até a janela de cada interface aparecer.
+
+Cada caso roda em um processo separado, para que o pico de memória (RSS) medido
+seja apenas o dele. O resultado é gravado em JSON, para comparar versões na mesma máquina:
+
+    python benchmark.py --saida bench.json
+    python benchmark.py --rapido --casos pdf converter
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import hashlib
+import argparse
+import platform
+import tempfile
+import subprocess
+import contextlib
+import io
+
+import numpy as np
+from PIL import Image
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+PASTA_REPO = os.path.dirname(os.path.abspath(__file__))
+PASTA_CORPUS = os.path.join(PASTA_REPO, ".cache", "bench")
+
+# ----- corpus sintético -----
+
+def _gerar_carta(rng, largura, altura, com_alfa):
+    """Gera uma carta sintética: borda sólida, arte em gradiente com ruído e cantos arredondados."""
+    y = np.linspace(0.0, 1.0, altura, dtype=np.float32)[:, None, None]
+    x = np.linspace(0.0, 1.0, largura, dtype=np.float32)[None, :, None]
+    c1, c2 = rng.integers(0, 256, (2, 3)).astype(np.float32)
+    arte = c1 + (c2 - c1) * (x + y) / 2 + rng.normal(0, 6, (altura, largura, 3)).astype(np.float32)
+    rgb = np.clip(arte, 0, 255).astype(np.uint8)
+    borda = max(4, int(largura * 0.045))
+    cor_borda = rng.integers(0, 60, 3).astype(np.uint8)
+    rgb[:borda], rgb[-borda:], rgb[:, :borda], rgb[:, -borda:] = cor_borda, cor_borda, cor_borda, cor_borda
+    if not com_alfa:
+        return Image.fromarray(rgb, "RGB")
+    # Cantos arredondados transparentes, como nos PNGs do Scryfall
+    raio = max(2, int(largura * 0.035))
+    yy, xx = np.mgrid[0:altura, 0:largura]
+    dx = np.maximum(np.maximum(raio - xx, xx - (largura - 1 - raio)), 0)
+    dy = np.maximum(np.maximum(raio - yy, yy - (altura - 1 - raio)), 0)
+    alfa = np.where(dx * dx + dy * dy > raio * raio, 0, 255).astype(np.uint8)
+    return Image.fromarray(np.dstack([rgb, alfa]), "RGBA")
+
+def gerar_corpus(pasta, n, tamanhos=((488, 680), (745, 1040)), proporcao_jpeg=0.5,
+                 proporcao_alfa=0.5, proporcao_duplicadas=0.2, semente=0):
+    """
+    Gera 'n' cartas sintéticas em 'pasta' e retorna a lista de arquivos (ordenada).
+
+    Parâmetros:
+      - tamanhos: Tamanhos (largura, altura) em px, sorteados por carta.
+      - proporcao_jpeg: Fração das cartas salvas como JPEG (sempre sem alfa).
+      - proporcao_alfa: Fração das cartas PNG com cantos transparentes.
+      - proporcao_duplicadas: Fração das cartas que são cópias idênticas de outra.
+      - semente: Semente do gerador aleatório (o corpus é sempre o mesmo para a mesma semente).
+    """
+    os.makedirs(pasta, exist_ok=True)
+    rng = np.random.default_rng(semente)
+    n_unicas = max(1, n - int(n * proporcao_duplicadas))
+    arquivos = []
+    for i in range(n_unicas):
+        largura, altura = tamanhos[rng.integers(len(tamanhos))]
+        jpeg = rng.random() < proporcao_jpeg
+        com_alfa = not jpeg and rng.random() < proporcao_alfa
+        img = _gerar_carta(rng, largura, altura, com_alfa)
+        caminho = os.path.join(pasta, f"carta_{i:04d}" + (".jpg" if jpeg else ".png"))
+        if jpeg:
+            img.save(caminho, format="JPEG", quality=90)
+        else:
+            img.save(caminho, format="PNG")
+        arquivos.append(caminho)
+    for i in range(n_unicas, n):
+        origem = arquivos[rng.integers(n_unicas)]
+        caminho = os.path.join(pasta, f"carta_{i:04d}" + os.path.splitext(origem)[1])
+        shutil.copyfile(origem, caminho)
+        arquivos.append(caminho)
+    return sorted(arquivos)
+
+def obter_corpus(nome, n, **opcoes):
+    """Retorna a pasta de um corpus, gerando-o apenas na primeira vez (cache por parâmetros)."""
+    assinatura = hashlib.sha1(json.dumps([nome, n, opcoes], sort_keys=True).encode()).hexdigest()[:12]
+    pasta = os.path.join(PASTA_CORPUS, f"{nome}-{n}-{assinatura}")
+    if not os.path.exists(os.path.join(pasta, ".completo")):
+        shutil.rmtree(pasta, ignore_errors=True)
+        gerar_corpus(pasta, n, **opcoes)
+        open(os.path.join(pasta, ".completo"), "w").close()
+    return pasta
+
+def listar_imagens(pasta):
+    extensoes = ('.png', '.jpg', '.jpeg', '.tiff', '.bmp')
+    return sorted(os.path.join(pasta, f) for f in os.listdir(pasta) if f.lower().endswith(extensoes))
+
+# ----- medições -----
+
+def resumir(nome, parametros, latencias, total_s, n, bytes_saida=None):
+    """Monta o registro de resultado de um caso: throughput, p50/p95, pico de RSS e tamanho da saída."""
+    latencias_ms = np.asarray(latencias, dtype=np.float64) * 1000.0
+    rss_proprio, rss_filhos = pico_rss_mb()
+    return {
+        "caso": nome,
+        "parametros": parametros,
+        "n": n,
+        "total_s": round(total_s, 4),
+        "throughput_por_s": round(n / total_s, 3) if total_s > 0 else None,
+        "p50_ms": round(float(np.percentile(latencias_ms, 50)), 3) if len(latencias_ms) else None,
+        "p95_ms": round(float(np.percentile(latencias_ms, 95)), 3) if len(latencias_ms) else None,
+        "pico_rss_mb": rss_proprio,
+        "pico_rss_filhos_mb": rss_filhos,
+        "bytes_saida": bytes_saida,
+    }
+
+def pico_rss_mb():
+    """
+    Pico de memória residente (MB) deste processo e o maior pico entre os processos filhos
+    já encerrados (ex.: workers da conversão), como (proprio, filhos). São picos de
+    processos distintos, em momentos possivelmente diferentes: não devem ser somados.
+    """
+    if resource is None:
+        return None, None
+    # ru_maxrss vem em KB no Linux e em bytes no macOS
+    divisor = 1024 * 1024 if sys.platform == "darwin" else 1024
+    proprio = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    filhos = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    return round(proprio / divisor, 2), round(filhos / divisor, 2)
+
+def tamanho_pasta(pasta):
+    return sum(os.path.getsize(os.path.join(pasta, f)) for f in os.listdir(pasta))
+
+def _cronometrar(func, itens):
+    latencias = []
+    inicio = time.perf_counter()
+    for item in itens:
+        t0 = time.perf_counter()
+        func(item)
+        latencias.append(time.perf_counter() - t0)
+    return latencias, time.perf_counter() - inicio
+
+# ----- casos -----
+
+def caso_redimensionar(p, trabalho):
+    from proxy import redimensionar_manter_proporcao, mm_para_px
+    largura, altura = mm_para_px(63, p["dpi"]), mm_para_px(88, p["dpi"])
+    imagens = []
+    for caminho in listar_imagens(obter_corpus("entrada", p["n"])):
+        with Image.open(caminho) as img:
+            imagens.append(img.convert("RGBA"))
+    latencias, total = _cronometrar(lambda img: redimensionar_manter_proporcao(img, largura, altura), imagens)
+    return resumir("redimensionar", p, latencias, total, len(imagens))
+
+def caso_process_image(p, trabalho):
+    from proxy import process_image, mm_para_px
+    largura, altura = mm_para_px(63, p["dpi"]), mm_para_px(88, p["dpi"])
+    arquivos = listar_imagens(obter_corpus("entrada", p["n"]))
+    saida = os.path.join(trabalho, "saida")
+    os.makedirs(saida)
+    latencias, total = _cronometrar(lambda c: process_image(c, saida, largura, altura, p["dpi"]), arquivos)
+    return resumir("process_image", p, latencias, total, len(arquivos), tamanho_pasta(saida))
+
+def caso_converter(p, trabalho):
+    import tracing
+    from proxy import converter_para_63x88_mm
+    entrada = obter_corpus("entrada", p["n"])
+    saida = os.path.join(trabalho, "saida")
+    tracing.limpar()
+    inicio = time.perf_counter()
+    converter_para_63x88_mm(entrada, saida, dpi=p["dpi"], num_workers=p["workers"])
+    total = time.perf_counter() - inicio
+    n = len(listar_imagens(entrada))
+    # Latência real de cada imagem, medida no worker que a processou
+    return resumir("converter", p, tracing.duracoes("conversao.imagem"), total, n, tamanho_pasta(saida))
+
+def caso_pdf(p, trabalho):
+    from pdf import criar_pdf_com_cartas
+    from proxy import mm_para_px
+    tamanho = (mm_para_px(63, p["dpi"]), mm_para_px(88, p["dpi"]))
+    pasta = obter_corpus("cartas", p["cartas"], tamanhos=(tamanho,), proporcao_jpeg=0.0)
+    pdf_saida = os.path.join(trabalho, "saida.pdf")
+    inicio = time.perf_counter()
+    criar_pdf_com_cartas(pasta, pdf_saida)
+    total = time.perf_counter() - inicio
+    return resumir("pdf", p, [total], total, p["cartas"], os.path.getsize(pdf_saida))
+
+def caso_pdf_reconstrucao(p, trabalho):
+    """
+    Gera o PDF, troca 'trocas' cartas do deck e mede só a nova geração. Com 'renomear',
+    as cartas trocadas saem do deck e as novas entram com outro nome (como acontece com
+    os downloads, nomeados pelo id do Scryfall); sem ele, o conteúdo é trocado mantendo
+    os nomes.
+    """
+    from pdf import criar_pdf_com_cartas
+    from proxy import mm_para_px
+    tamanho = (mm_para_px(63, p["dpi"]), mm_para_px(88, p["dpi"]))
+    origem = obter_corpus("cartas", p["cartas"] + p["trocas"], tamanhos=(tamanho,), proporcao_jpeg=0.0)
+    imagens = listar_imagens(origem)
+    pasta = os.path.join(trabalho, "deck")
+    os.makedirs(pasta)
+    for caminho in imagens[:p["cartas"]]:
+        shutil.copy(caminho, pasta)
+    pdf_saida = os.path.join(trabalho, "saida.pdf")
+    criar_pdf_com_cartas(pasta, pdf_saida)
+    # Troca cartas espalhadas pelo deck por outras do corpus
+    passo = max(1, p["cartas"] // max(1, p["trocas"]))
+    for i, nova in enumerate(imagens[p["cartas"]:]):
+        antiga = os.path.join(pasta, os.path.basename(imagens[(i * passo) % p["cartas"]]))
+        if p.get("renomear"):
+            os.remove(antiga)
+            shutil.copy(nova, os.path.join(pasta, f"{i:03d}-nova-{os.path.basename(nova)}"))
+        else:
+            shutil.copy(nova, antiga)
+    inicio = time.perf_counter()
+    criar_pdf_com_cartas(pasta, pdf_saida, incremental=p["incremental"])
+    total = time.perf_counter() - inicio
+    return resumir("pdf_reconstrucao", p, [total], total, p["cartas"], os.path.getsize(pdf_saida))
+
+def caso_busca_bulk(p, trabalho):
+    """
+    Busca uma lista de cartas no servidor substituto, com latência e falhas injetadas.
+    As falhas não são repetidas pelo card_search: uma busca sem carta (None) ou com a
+    lista de prints cortada no meio da paginação termina mais cedo. Elas são contadas à
+    parte (comparadas com uma segunda passada sem falhas) e ficam fora de p50/p95.
+    """
+    import card_search
+    from fake_scryfall import servidor_local, Falhas
+    linhas = [f"{1 + i % 4}x Carta Sintética {i}" for i in range(p["cartas"])]
+
+    def buscar(linha):
+        _, nome = card_search.interpretar_linha(linha)
+        card = card_search.buscar_carta(nome)
+        return card_search.buscar_prints(card["oracle_id"]) if card else None
+
+    obtidos = {}
+
+    def buscar_e_guardar(linha):
+        obtidos[linha] = buscar(linha)
+
+    falhas = Falhas(p.get("latencia_ms", 0), taxa_429=p.get("taxa_429", 0.0), taxa_5xx=p.get("taxa_5xx", 0.0))
+    with servidor_local(p.get("fixtures"), sintetico=True, falhas=falhas) as url_base:
+        card_search.SCRYFALL_API = url_base
+        latencias, total = _cronometrar(buscar_e_guardar, linhas)
+    with servidor_local(p.get("fixtures"), sintetico=True) as url_base:
+        card_search.SCRYFALL_API = url_base
+        esperados = {linha: len(buscar(linha) or []) for linha in linhas}
+
+    sem_carta = [obtidos[linha] is None for linha in linhas]
+    incompletas = [obtidos[linha] is not None and len(obtidos[linha]) < esperados[linha] for linha in linhas]
+    completas = [t for t, a, b in zip(latencias, sem_carta, incompletas) if not (a or b)]
+    resultado = resumir("busca_bulk", p, completas, total, len(linhas))
+    resultado["buscas_sem_carta"] = sum(sem_carta)
+    resultado["buscas_incompletas"] = sum(incompletas)
+    return resultado
+
+def _tempo_python(codigo, cwd):
+    inicio = time.perf_counter()
+    subprocess.run([sys.executable, "-c", codigo], cwd=cwd, check=True, env=_env_repo())
+    return time.perf_counter() - inicio
+
+def _env_repo():
+    env = dict(os.environ)
+    env["PYTHONPATH"] = PASTA_REPO + os.pathsep + env.get("PYTHONPATH", "")
+    return env
+
+def caso_importacao(p, trabalho):
+    """Tempo de 'import <modulo>' em um interpretador novo, descontado o tempo de partida do Python."""
+    base = min(_tempo_python("pass", trabalho) for _ in range(3))
+    antes = set(os.listdir(trabalho))
+    latencias = [max(0.0, _tempo_python(f"import {p['modulo']}", trabalho) - base) for _ in range(p["repeticoes"])]
+    resultado = resumir("importacao", p, latencias, sum(latencias), len(latencias))
+    # Importar um módulo não deve criar nada no diretório de trabalho
+    resultado["arquivos_criados"] = sorted(set(os.listdir(trabalho)) - antes)
+    return resultado
+
+# Cria a janela, espera ela ser desenhada e informa quanto tempo passou desde o início do processo
+_CODIGO_JANELA = """
+import sys, time
+inicio = float(sys.argv[1])
+import {modulo}
+{criar}
+root.update()
+print(time.time() - inicio)
+root.destroy()
+"""
+
+def caso_janela(p, trabalho):
+    """Tempo desde o início do processo até a janela aparecer (None se não houver display)."""
+    criar = {
+        "main_gui": "root = main_gui.create_gui()",
+        "card_search": "root = card_search.tk.Tk()\napp = card_search.CardSearchGUI(root)",
+    }[p["modulo"]]
+    codigo = _CODIGO_JANELA.format(modulo=p["modulo"], criar=criar)
+    latencias = []
+    for _ in range(p["repeticoes"]):
+        r = subprocess.run([sys.executable, "-c", codigo, repr(time.time())], cwd=trabalho,
+                           capture_output=True, text=True, env=_env_repo())
+        if r.returncode != 0:
+            resultado = resumir("janela", p, [], 0.0, 0)
+            resultado["erro"] = r.stderr.strip().splitlines()[-1] if r.stderr.strip() else "falhou"
+            return resultado
+        latencias.append(float(r.stdout.strip().splitlines()[-1]))
+    return resumir("janela", p, latencias, sum(latencias), len(latencias))
+
+CASOS = {
+    "redimensionar": caso_redimensionar,
+    "process_image": caso_process_image,
+    "converter": caso_converter,
+    "pdf": caso_pdf,
+    "pdf_reconstrucao": caso_pdf_reconstrucao,
+    "busca_bulk": caso_busca_bulk,
+    "importacao": caso_importacao,
+    "janela": caso_janela,
+}
+
+def plano(rapido=False):
+    """Lista (caso, parâmetros) a executar."""
+    n = 12 if rapido else 48
+    workers = sorted({1, 2, 4, os.cpu_count() or 1})
+    execucoes = [
+        ("redimensionar", {"n": n, "dpi": 600}),
+        ("process_image", {"n": n, "dpi": 600}),
+    ]
+    execucoes += [("converter", {"n": n, "dpi": 600, "workers": w}) for w in workers]
+    execucoes += [("pdf", {"cartas": c, "dpi": 300}) for c in ((9, 90) if rapido else (9, 90, 900))]
+    execucoes += [("pdf_reconstrucao", {"cartas": 90 if rapido else 900, "trocas": 3, "dpi": 300,
+                                        "incremental": inc, "renomear": renomear})
+                  for inc, renomear in ((False, False), (True, False), (True, True))]
+    execucoes.append(("busca_bulk", {"cartas": 20 if rapido else 100, "latencia_ms": 0}))
+    execucoes.append(("busca_bulk", {"cartas": 20 if rapido else 100, "latencia_ms": 50, "taxa_429": 0.05}))
+    repeticoes = 3 if rapido else 10
+    for modulo in ("card_search", "main_gui", "proxy", "pdf"):
+        execucoes.append(("importacao", {"modulo": modulo, "repeticoes": repeticoes}))
+    for modulo in ("card_search", "main_gui"):
+        execucoes.append(("janela", {"modulo": modulo, "repeticoes": repeticoes}))
+    return execucoes
+
+def executar_caso(nome, parametros):
+    """Executa um caso em um subprocesso (diretório de trabalho temporário) e retorna o resultado."""
+    with tempfile.TemporaryDirectory() as trabalho:
+        arquivo_resultado = os.path.join(trabalho, "resultado.json")
+        subprocess.run(
+            [sys.executable, os.path.abspath(__file__), "--_caso", nome, json.dumps(parametros), arquivo_resultado],
+            cwd=trabalho, check=True
+        )
+        with open(arquivo_resultado, "r", encoding="utf-8") as f:
+            return json.load(f)
+
+def _executar_no_filho(nome, parametros, arquivo_resultado):
+    trabalho = os.path.dirname(arquivo_resultado)
+    # Silencia os prints dos módulos medidos: eles não fazem parte do resultado
+    with contextlib.redirect_stdout(io.StringIO()):
+        resultado = CASOS[nome](parametros, trabalho)
+    with open(arquivo_resultado, "w", encoding="utf-8") as f:
+        json.dump(resultado, f)
+
+def info_maquina():
+    try:
+        commit = subprocess.run(["git", "rev-parse", "HEAD"], cwd=PASTA_REPO, capture_output=True, text=True).stdout.strip()
+    except OSError:
+        commit = None
+    return {
+        "python": platform.python_version(),
+        "plataforma": platform.platform(),
+        "processador": platform.processor(),
+        "cpus": os.cpu_count(),
+        "commit": commit or None,
+    }
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmarks dos caminhos críticos do gerador de proxies.")
+    parser.add_argument("--saida", default="bench.json", help="Arquivo JSON de resultado.")
+    parser.add_argument("--rapido", action="store_true", help="Corpus e escalas menores.")
+    parser.add_argument("--casos", nargs="*", choices=sorted(CASOS), help="Executa apenas estes casos.")
+    parser.add_argument("--_caso", nargs=3, help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args._caso:
+        sys.path.insert(0, PASTA_REPO)
+        nome, parametros, arquivo_resultado = args._caso
+        _executar_no_filho(nome, json.loads(parametros), arquivo_resultado)
+        return
+
+    resultados = []
+    for nome, parametros in plano(args.rapido):
+        if args.casos and nome not in args.casos:
+            continue
+        print(f"Executando {nome} {parametros}...")
+        resultado = executar_caso(nome, parametros)
+        print(f"  {resultado['total_s']:.3f} s, {resultado['throughput_por_s']}/s, p95 {resultado['p95_ms']} ms")
+        if "buscas_sem_carta" in resultado:
+            print(f"  falhas: {resultado['buscas_sem_carta']} sem carta, {resultado['buscas_incompletas']} com prints incompletos")
+        resultados.append(resultado)
+
+    with open(args.saida, "w", encoding="utf-8") as f:
+        json.dump({"maquina": info_maquina(), "resultados": resultados}, f, indent=2)
+    print(f"Resultados salvos em: {args.saida}")
+
+if __name__ == "__main__":
+    main()
@@ -3,36 +3,68 @@ import sys
 import json
 import re
 import threading
-import tkinter as tk
-from tkinter import ttk, messagebox, scrolledtext
 from io import BytesIO
-import requests
-from PIL import Image, ImageTk
 
-# Diretório onde as imagens serão baixadas
+from lazy_import import importar_sob_demanda, precarregar
+from image_store import ImageStore, chave_da_url, extensao_da_url
+from prefetch import Prefetcher
+from phash import PerceptualHashCache, agrupar_por_arte
+import tracing
+
+# Dependências pesadas: importadas apenas no primeiro uso, para que importar este
+# módulo (ex.: só para buscar_carta/buscar_prints) seja rápido e sem efeitos colaterais
+tk = importar_sob_demanda("tkinter")
+ttk = importar_sob_demanda("tkinter.ttk")
+messagebox = importar_sob_demanda("tkinter.messagebox")
+scrolledtext = importar_sob_demanda("tkinter.scrolledtext")
+requests = importar_sob_demanda("requests")
+Image = importar_sob_demanda("PIL.Image")
+ImageTk = importar_sob_demanda("PIL.ImageTk")
+
+# Diretório onde as imagens serão baixadas (criado no primeiro download)
 IMAGES_DIR = "imagens"
-if not os.path.exists(IMAGES_DIR):
-    os.makedirs(IMAGES_DIR)
+
+# Trace e métricas desta janela (API, thumbnails, pré-download e downloads); nomes
+# próprios para não sobrescrever os arquivos gravados pelo main_gui.py
+TRACE_JSON = "trace_busca.json"
+METRICS_PROM = "metricas_busca.prom"
+
+# Endereço base da API do Scryfall (pode apontar para um servidor local em testes/benchmarks)
+SCRYFALL_API = os.environ.get("SCRYFALL_API", "https://api.scryfall.com")
 
 # Função para buscar a carta (busca única) – busca em inglês para obter o oracle_id
 def buscar_carta(card_name):
-    url = "https://api.scryfall.com/cards/named"
+    url = f"{SCRYFALL_API}/cards/named"
     params = {"exact": card_name, "lang": "en"}
     headers = {"Accept": "application/json", "User-Agent": "CardSearchApp/1.0"}
-    response = requests.get(url, params=params, headers=headers)
+    with tracing.etapa("api.named") as attrs:
+        response = requests.get(url, params=params, headers=headers)
+        attrs["bytes_entrada"] = len(response.content)
     if response.status_code == 200:
         return response.json()
     else:
         return None
 
-# Função para buscar todos os prints de uma carta dado o oracle_id e idioma
-def buscar_prints(oracle_id, lang):
-    query = f"oracleid:{oracle_id} lang:{lang} unique:prints"
-    url = "https://api.scryfall.com/cards/search"
-    params = {"q": query}
+# Idiomas buscados por padrão (usados pelos filtros das abas)
+IDIOMAS_PADRAO = ("en", "pt")
+
+# Função para buscar todos os prints de uma carta dado o oracle_id, em vários idiomas
+# numa única consulta paginada (o campo "lang" já vem preenchido pela API).
+# O antigo parâmetro "lang" (um único idioma) continua aceito como sinônimo de "langs".
+def buscar_prints(oracle_id, langs=IDIOMAS_PADRAO, lang=None):
+    if lang is not None:
+        langs = lang
+    if isinstance(langs, str):
+        langs = (langs,)
+    filtro_lang = " or ".join(f"lang:{lang}" for lang in langs)
+    query = f"oracleid:{oracle_id} ({filtro_lang}) unique:prints"
+    url = f"{SCRYFALL_API}/cards/search"
+    params = {"q": query, "include_multilingual": "true"}
     prints = []
     while url:
-        response = requests.get(url, params=params)
+        with tracing.etapa("api.search") as attrs:
+            response = requests.get(url, params=params)
+            attrs["bytes_entrada"] = len(response.content)
         if response.status_code != 200:
             break
         data = response.json()
@@ -44,6 +76,20 @@ def buscar_prints(oracle_id, lang):
             url = None
     return prints
 
+# Função para filtrar localmente uma lista de prints pelo idioma escolhido no combobox
+def filtrar_por_idioma(prints, filtro):
+    if filtro == "ambos":
+        return list(prints)
+    return [p for p in prints if p.get("lang") == filtro]
+
+# Função para interpretar uma linha da lista em massa ("4x Nome (SET) 123" ou "Nome")
+# Retorna (quantidade, nome da carta)
+def interpretar_linha(linha):
+    match = re.match(r'(\d+)(x)?\s+(.*)', linha)
+    if match:
+        return int(match.group(1)), match.group(3).split('(')[0].strip()
+    return 1, linha
+
 # Função para obter o URL da arte em qualidade máxima (PNG)
 def obter_url_maxima(card):
     if "card_faces" in card and card["card_faces"]:
@@ -54,14 +100,27 @@ def obter_url_maxima(card):
         return card["image_uris"]["png"]
     return None
 
+# Função para escolher, de um par (en, pt), a versão que será impressa:
+# a versão em inglês se disponível; caso contrário, a em português.
+def escolher_carta(par):
+    if not par:
+        return None
+    return par[0] if par[0].get("lang") == "en" else par[1]
+
 # Função para realizar uma requisição HEAD e obter o tamanho (em MB) da imagem
+# Tamanhos já consultados, por URL: refiltrar ou redesenhar a lista não repete os HEADs
+_tamanhos_cache = {}
+
 def get_image_size_mb(url):
+    if url in _tamanhos_cache:
+        return _tamanhos_cache[url]
     try:
         head = requests.head(url)
         if "Content-Length" in head.headers:
             size_bytes = int(head.headers["Content-Length"])
             size_mb = size_bytes / (1024 * 1024)
-            return f"{size_mb:.2f} MB"
+            _tamanhos_cache[url] = f"{size_mb:.2f} MB"
+            return _tamanhos_cache[url]
     except Exception as e:
         return "Tamanho desconhecido"
     return "Tamanho desconhecido"
@@ -99,27 +158,35 @@ def visualizar_imagem(url):
     info_lbl.pack()
 
 # Função para limpar a pasta de imagens (baixadas)
-def limpar_pasta():
+# Remove apenas as vistas do job; as imagens continuam no armazenamento local
+# até a coleta de lixo (LRU com limite de tamanho) decidir removê-las.
+def limpar_pasta(store=None):
+    if not os.path.exists(IMAGES_DIR):
+        return
     for f in os.listdir(IMAGES_DIR):
         path = os.path.join(IMAGES_DIR, f)
         try:
-            if os.path.isfile(path):
+            if os.path.isfile(path) or os.path.islink(path):
                 os.remove(path)
         except Exception as e:
             pass
+    if store is not None:
+        store.coletar_lixo()
 
-# Função para baixar uma imagem e salvá-la na pasta IMAGES_DIR
-def baixar_imagem(url, filename):
-    try:
-        response = requests.get(url, stream=True)
-        if response.status_code == 200:
-            filepath = os.path.join(IMAGES_DIR, filename)
-            with open(filepath, "wb") as f:
-                for chunk in response.iter_content(1024):
-                    f.write(chunk)
-            return filepath
-    except Exception as e:
+# Função para obter o nome do arquivo de uma imagem na pasta IMAGES_DIR.
+# O nome vem da chave da imagem (id/face/versão), evitando colisões entre prints
+# diferentes que compartilham o mesmo nome de arquivo na URL.
+def nome_arquivo_imagem(url):
+    return chave_da_url(url) + extensao_da_url(url)
+
+# Função para baixar uma imagem (ou reaproveitá-la do armazenamento local)
+# e criar sua vista na pasta IMAGES_DIR
+def baixar_imagem(url, filename, store=None):
+    store = store if store is not None else ImageStore()
+    chave = chave_da_url(url)
+    if not store.baixar(url, chave):
         return None
+    return store.vincular(chave, os.path.join(IMAGES_DIR, filename))
 
 # Classe que implementa a GUI de busca de cartas
 class CardSearchGUI:
@@ -127,8 +194,17 @@ class CardSearchGUI:
         self.root = root
         self.root.title("Busca de Cartas - Scryfall")
         self.root.geometry("900x700")
+        self.root.protocol("WM_DELETE_WINDOW", self.fechar)
         self.selected_cards = []  # Armazenará os cards selecionados para download
+        self.escolhas_bulk = {}  # Por carta: (edição escolhida, confirmada), preservadas ao refiltrar
         self.thumbnail_cache = {}  # Cache para thumbnails
+        self.prints_cache = {}  # Prints já buscados, por oracle_id (todos os idiomas)
+        self.resultados_single = []  # Últimos resultados da aba única (sem filtro)
+        self.resultados_bulk = []  # Últimos resultados da aba em massa (sem filtro)
+        self.store = ImageStore()  # Armazenamento local de imagens compartilhado entre jobs
+        self.prefetcher = Prefetcher(self.store)  # Pré-download da edição padrão de cada carta
+        self.nomes_prefetch = set()  # Cartas da aba em massa com pré-download agendado
+        self.phash_cache = PerceptualHashCache()  # Hashes perceptuais persistidos entre sessões
 
         self.tabControl = ttk.Notebook(root)
         self.tab_single = ttk.Frame(root)
@@ -156,8 +232,12 @@ class CardSearchGUI:
         self.combo_filtro = ttk.Combobox(filtro_frame, textvariable=self.filtro_var, state="readonly", width=15)
         self.combo_filtro['values'] = ("en", "pt", "ambos")
         self.combo_filtro.pack(side=tk.LEFT, padx=5)
+        self.combo_filtro.bind("<<ComboboxSelected>>", lambda e: self.aplicar_filtro())
         btn_filtrar = ttk.Button(filtro_frame, text="Aplicar Filtro", command=self.aplicar_filtro)
         btn_filtrar.pack(side=tk.LEFT, padx=5)
+        self.agrupar_var = tk.IntVar(value=0)
+        chk_agrupar = ttk.Checkbutton(filtro_frame, text="Agrupar artes idênticas", variable=self.agrupar_var, command=self.aplicar_filtro)
+        chk_agrupar.pack(side=tk.LEFT, padx=5)
         self.results_frame_single = ttk.Frame(frame)
         self.canvas_single = tk.Canvas(self.results_frame_single, height=300)
         self.scrollbar_single = ttk.Scrollbar(self.results_frame_single, orient="vertical", command=self.canvas_single.yview)
@@ -184,6 +264,7 @@ class CardSearchGUI:
         self.combo_bulk_filtro = ttk.Combobox(filtro_frame, textvariable=self.bulk_filtro_var, state="readonly", width=15)
         self.combo_bulk_filtro['values'] = ("en", "pt", "ambos")
         self.combo_bulk_filtro.pack(side=tk.LEFT, padx=5)
+        self.combo_bulk_filtro.bind("<<ComboboxSelected>>", lambda e: self.aplicar_filtro_bulk())
         btn_bulk = ttk.Button(frame, text="Buscar Lista de Cartas", command=self.buscar_carta_bulk)
         btn_bulk.pack(pady=10)
         self.results_frame_bulk = ttk.Frame(frame)
@@ -209,9 +290,12 @@ class CardSearchGUI:
 
     def carregar_imagem_thumbnail(self, url):
         if url in self.thumbnail_cache:
+            tracing.contar("thumbnails.acertos")
             return self.thumbnail_cache[url]
+        tracing.contar("thumbnails.faltas")
         try:
-            response = requests.get(url)
+            with tracing.etapa("thumbnail", url=url):
+                response = requests.get(url)
             if response.status_code == 200:
                 data = response.content
                 pil_img = Image.open(BytesIO(data))
@@ -223,12 +307,10 @@ class CardSearchGUI:
             self.log(f"Erro ao carregar thumbnail: {e}")
         return None
 
-    def exibir_resultados(self, resultados):
+    def exibir_resultados(self, resultados, manter_selecao=False):
         # Se estivermos na aba Bulk, aplicar filtro antes de agrupar
         if self.tabControl.index("current") == 1:
-            filtro = self.bulk_filtro_var.get()
-            if filtro != "ambos":
-                resultados = [card for card in resultados if card.get("lang") == filtro]
+            resultados = filtrar_por_idioma(resultados, self.bulk_filtro_var.get())
             groups = {}
             for card in resultados:
                 name = card.get("name", "N/A")
@@ -255,15 +337,34 @@ class CardSearchGUI:
             for widget in self.scrollable_frame_single.winfo_children():
                 widget.destroy()
             container = self.scrollable_frame_single
-            self.selected_cards = []
-            filtro = self.filtro_var.get()
-            lista_resultados = [card for card in resultados if card.get("lang") == filtro]
-            for idx, card in enumerate(lista_resultados):
+            if not manter_selecao:
+                self.selected_cards = []
+            lista_resultados = filtrar_por_idioma(resultados, self.filtro_var.get())
+            # Com o agrupamento ativo, prints com a mesma arte viram uma única linha
+            if self.agrupar_var.get():
+                variantes_por_linha = agrupar_por_arte(lista_resultados, self.phash_cache)
+            else:
+                variantes_por_linha = [[card] for card in lista_resultados]
+            for idx, variantes in enumerate(variantes_por_linha):
+                card = variantes[0]
                 frame = ttk.Frame(container, relief=tk.RIDGE, borderwidth=2)
                 frame.pack(fill="x", pady=5, padx=5)
                 txt = f"{card.get('name', 'N/A')} - {card.get('set_name', 'N/A')} #{card.get('collector_number', 'N/A')}"
+                if len(variantes) > 1:
+                    txt += f" (+{len(variantes) - 1} com a mesma arte)"
                 lbl = ttk.Label(frame, text=txt)
                 lbl.pack(anchor="w", padx=5, pady=2)
+                combo = None
+                if len(variantes) > 1:
+                    # Seletor de variante: todos os prints com arte idêntica
+                    mapping = {}
+                    for variante in variantes:
+                        option = f"{variante.get('set_name', 'N/A')} #{variante.get('collector_number', 'N/A')} ({variante.get('lang', 'N/A')})"
+                        mapping[option] = variante
+                    combo = ttk.Combobox(frame, values=list(mapping.keys()), state="readonly", width=40)
+                    combo.current(0)
+                    combo.mapping = mapping
+                    combo.pack(anchor="w", padx=5)
                 url = obter_url_maxima(card)
                 if url:
                     img = self.carregar_imagem_thumbnail(url)
@@ -273,14 +374,23 @@ class CardSearchGUI:
                     lbl_img.bind("<Button-1>", lambda e, url=url: visualizar_imagem(url))
                     size = get_image_size_mb(url)
                     ttk.Label(frame, text=f"Tamanho: {size}").pack(side="left", padx=5)
-                btn = ttk.Button(frame, text="Selecionar esta arte", command=lambda c=card: self.adicionar_selecionado(c))
+                def selecionar(c=card, cmb=combo):
+                    self.adicionar_selecionado(cmb.mapping.get(cmb.get(), c) if cmb else c)
+                btn = ttk.Button(frame, text="Selecionar esta arte", command=selecionar)
                 btn.pack(anchor="e", padx=5, pady=5)
 
     def exibir_resultados_bulk(self, groups):
         for widget in self.scrollable_frame_bulk.winfo_children():
             widget.destroy()
         container = self.scrollable_frame_bulk
+        # As confirmações ficam em self.escolhas_bulk e são reaplicadas abaixo
         self.selected_cards = []
+        # Os pré-downloads são identificados pelo nome da carta: um refiltro reagenda a
+        # mesma URL (sem efeito) e só cancela as cartas que saíram da lista
+        nomes = {name for name, _ in groups}
+        for nome in self.nomes_prefetch - nomes:
+            self.prefetcher.cancelar(nome)
+        self.nomes_prefetch = nomes
         # Para cada grupo (nome da carta, edições)
         for name, edicoes in groups:
             # Use tk.Frame para permitir destaque (borda verde)
@@ -306,25 +416,35 @@ class CardSearchGUI:
                 combo.current(0)
                 combo.mapping = mapping
                 combo.pack(anchor="w", padx=5)
-            def update_preview(event, grp=group_frame, cmb=combo):
+            # Restaura a edição escolhida antes de um refiltro, se ela ainda estiver na lista
+            escolha, confirmada = self.escolhas_bulk.get(name, (None, False))
+            if escolha in combo.mapping:
+                combo.set(escolha)
+            else:
+                confirmada = False
+            def update_preview(event, grp=group_frame, cmb=combo, nome=name):
                 option = cmb.get()
                 par = cmb.mapping.get(option)
+                self.escolhas_bulk[nome] = (option, self.escolhas_bulk.get(nome, (None, False))[1])
                 self.atualizar_preview_bulk(grp, par)
+                self.agendar_prefetch(nome, par)
             combo.bind("<<ComboboxSelected>>", update_preview)
             # Cria o frame para o preview e armazena uma tag para posterior limpeza
             preview_frame = ttk.Frame(group_frame)
             preview_frame.pack(fill="x", padx=5, pady=5)
             preview_frame.preview_tag = True
             self.atualizar_preview_bulk(group_frame, combo.mapping.get(combo.get()))
+            self.agendar_prefetch(name, combo.mapping.get(combo.get()))
             # Checkbutton para confirmar a escolha com borda verde
-            var = tk.IntVar(value=0)
-            def on_confirm(grp=group_frame, cmb=combo, v=var):
+            var = tk.IntVar(value=1 if confirmada else 0)
+            def on_confirm(grp=group_frame, cmb=combo, v=var, nome=name):
+                self.escolhas_bulk[nome] = (cmb.get(), v.get() == 1)
                 if v.get() == 1:
                     grp.config(highlightthickness=2, highlightbackground="green")
                     sel_par = cmb.mapping.get(cmb.get())
                     if sel_par:
                         # Exibe as duas versões lado a lado, mas a seleção final opta pela versão em inglês se disponível; caso contrário, a em português.
-                        card = sel_par[0] if sel_par[0].get("lang")=="en" else sel_par[1]
+                        card = escolher_carta(sel_par)
                         if card:
                             url = obter_url_maxima(card)
                             if url and not any(item.get("print_url") == url for item in self.selected_cards):
@@ -339,6 +459,17 @@ class CardSearchGUI:
                     grp.config(highlightthickness=0)
             chk = ttk.Checkbutton(group_frame, text="Confirmar", variable=var, command=lambda grp=group_frame, cmb=combo, v=var: on_confirm(grp, cmb, v))
             chk.pack(anchor="e", padx=5, pady=5)
+            if confirmada:
+                on_confirm(group_frame, combo, var)
+
+    def agendar_prefetch(self, chave, par):
+        # Começa a baixar em segundo plano a arte que será impressa para esta carta
+        card = escolher_carta(par)
+        url = obter_url_maxima(card) if card else None
+        if url:
+            self.prefetcher.agendar(chave, url)
+        else:
+            self.prefetcher.cancelar(chave)
 
     def atualizar_preview_bulk(self, parent_frame, par):
         # Remove previews antigos que estejam abaixo do combobox
@@ -389,42 +520,71 @@ class CardSearchGUI:
             messagebox.showwarning("Aviso", "Nenhuma imagem selecionada.")
             return
         self.log("Iniciando download das imagens selecionadas...")
-        for item in self.selected_cards:
-            url = item.get("print_url")
-            if url:
-                filename = os.path.basename(url.split("?")[0])
-                filepath = baixar_imagem(url, filename)
+        self.store.novo_job()
+        # O download roda fora da thread da interface; o log é atualizado via root.after
+        urls = [item.get("print_url") for item in self.selected_cards if item.get("print_url")]
+        threading.Thread(target=self._baixar_imagens, args=(urls,), daemon=True).start()
+
+    def _baixar_imagens(self, urls):
+        baixadas = []
+        for url in urls:
+            # Aproveita o pré-download já concluído ou em andamento (sem limite de banda);
+            # os que ainda estão na fila são cancelados e baixados aqui diretamente
+            self.prefetcher.obter(url, timeout=30)
+            chave = chave_da_url(url)
+            if self.store.baixar(url, chave):
+                baixadas.append((url, chave))
+            else:
+                self.root.after(0, self.log, f"Falha ao baixar: {url}")
+        # As vistas são criadas num único lote (o índice é gravado uma vez), depois dos
+        # downloads: o lote trava o armazenamento, e os pré-downloads aguardados acima
+        # precisam dele para terminar
+        with self.store.lote():
+            for url, chave in baixadas:
+                filepath = self.store.vincular(chave, os.path.join(IMAGES_DIR, nome_arquivo_imagem(url)))
                 if filepath:
-                    self.log(f"Baixada: {filepath}")
+                    self.root.after(0, self.log, f"Baixada: {filepath}")
                 else:
-                    self.log(f"Falha ao baixar: {url}")
-        self.log("Download concluído.")
+                    self.root.after(0, self.log, f"Falha ao baixar: {url}")
+        # Pré-downloads não escolhidos e imagens antigas saem ao fim de cada job
+        self.store.coletar_lixo()
+        self.root.after(0, self.log, "Download concluído.")
+        self.root.after(0, self.exportar_metricas)
 
-    def aplicar_filtro(self):
-        filtro = self.filtro_var.get()
-        card_name = self.entry_card.get().strip()
-        if not card_name:
+    def exportar_metricas(self):
+        """
+        Grava o trace e as métricas coletados desde a última exportação (buscas na API,
+        thumbnails, pré-downloads e downloads) e recomeça a coleta para o próximo job.
+        """
+        if not tracing.resumo()["etapas"]:
             return
-        self.log(f"Aplicando filtro: {filtro}")
-        card = buscar_carta(card_name)
-        if not card:
-            self.log("Carta não encontrada.")
+        tracing.exportar_json(TRACE_JSON)
+        tracing.exportar_prometheus(METRICS_PROM)
+        tracing.limpar()
+        self.log(f"Trace gravado em {TRACE_JSON} e métricas em {METRICS_PROM}.")
+
+    def fechar(self):
+        self.exportar_metricas()
+        self.root.destroy()
+
+    def obter_prints(self, oracle_id):
+        # Busca os prints uma única vez por oracle_id; trocas de filtro usam o cache
+        if oracle_id not in self.prints_cache:
+            self.prints_cache[oracle_id] = buscar_prints(oracle_id, IDIOMAS_PADRAO)
+        return self.prints_cache[oracle_id]
+
+    def aplicar_filtro(self):
+        # Operação puramente local: refiltra os prints já carregados
+        if not self.resultados_single:
             return
-        oracle_id = card.get("oracle_id")
-        if not oracle_id:
-            self.log("Oracle ID não encontrado.")
+        self.log(f"Aplicando filtro: {self.filtro_var.get()}")
+        self.exibir_resultados(self.resultados_single, manter_selecao=True)
+
+    def aplicar_filtro_bulk(self):
+        if not self.resultados_bulk:
             return
-        prints_en = buscar_prints(oracle_id, lang="en")
-        prints_pt = buscar_prints(oracle_id, lang="pt")
-        for p in prints_en:
-            p['lang'] = "en"
-        for p in prints_pt:
-            p['lang'] = "pt"
-        if filtro == "ambos":
-            resultados = prints_en + prints_pt
-        else:
-            resultados = [p for p in (prints_en + prints_pt) if p.get("lang") == filtro]
-        self.exibir_resultados(resultados)
+        self.log(f"Aplicando filtro: {self.bulk_filtro_var.get()}")
+        self.exibir_resultados(self.resultados_bulk, manter_selecao=True)
 
     def buscar_carta_single(self):
         card_name = self.entry_card.get().strip()
@@ -440,14 +600,8 @@ class CardSearchGUI:
         if not oracle_id:
             self.log("Oracle ID não encontrado.")
             return
-        prints_en = buscar_prints(oracle_id, lang="en")
-        prints_pt = buscar_prints(oracle_id, lang="pt")
-        for p in prints_en:
-            p['lang'] = "en"
-        for p in prints_pt:
-            p['lang'] = "pt"
-        resultados = prints_en + prints_pt
-        self.exibir_resultados(resultados)
+        self.resultados_single = self.obter_prints(oracle_id)
+        self.exibir_resultados(self.resultados_single)
 
     def buscar_carta_bulk(self):
         bulk_text = self.text_bulk.get("1.0", tk.END).strip()
@@ -460,13 +614,7 @@ class CardSearchGUI:
             linha = linha.strip()
             if not linha:
                 continue
-            match = re.match(r'(\d+)(x)?\s+(.*)', linha)
-            if match:
-                quantidade = int(match.group(1))
-                card_nome = match.group(3).split('(')[0].strip()
-            else:
-                quantidade = 1
-                card_nome = linha
+            quantidade, card_nome = interpretar_linha(linha)
             self.log(f"Buscando carta: {card_nome}")
             card = buscar_carta(card_nome)
             if not card:
@@ -476,20 +624,19 @@ class CardSearchGUI:
             if not oracle_id:
                 self.log(f"Oracle ID não encontrado para '{card_nome}'.")
                 continue
-            prints_en = buscar_prints(oracle_id, lang="en")
-            prints_pt = buscar_prints(oracle_id, lang="pt")
-            for p in prints_en:
-                p['lang'] = "en"
-            for p in prints_pt:
-                p['lang'] = "pt"
+            prints = self.obter_prints(oracle_id)
             for _ in range(quantidade):
-                resultados.extend(prints_en + prints_pt)
+                resultados.extend(prints)
+        self.resultados_bulk = resultados
+        self.escolhas_bulk = {}  # Nova busca: as confirmações anteriores não valem mais
         self.exibir_resultados(resultados)
 
 def main():
     root = tk.Tk()
     app = CardSearchGUI(root)
     app.thumbnail_cache = {}
+    # Com a janela já visível, carrega em segundo plano o que as buscas vão usar
+    root.after(0, lambda: precarregar(requests, Image, ImageTk))
     root.mainloop()
 
 if __name__ == "__main__":
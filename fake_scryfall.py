@@ -0,0 +1,324 @@
+"""
+Servidor local que substitui a API do Scryfall em testes e benchmarks.
+
+Modos de operação:
+  - Reprodução: responde /cards/named, /cards/search (com has_more/next_page),
+    /cards/collection e URLs de imagem a partir de fixtures gravadas.
+  - Gravação (--gravar): repassa as requisições ao Scryfall real, grava cada resposta
+    como fixture e devolve a resposta ao cliente.
+  - Sintético (--sintetico): quando não há fixture, gera cartas e prints sintéticos.
+
+Em qualquer modo é possível injetar latência, respostas 429 (rate limit), erros 5xx e
+corpos truncados, de forma determinística (semente fixa). URLs absolutas do Scryfall
+nas respostas são reescritas para apontar para o servidor local, de modo que a
+paginação e o download de imagens também passam por ele.
+
+    python fake_scryfall.py --fixtures fixtures --gravar
+    python fake_scryfall.py --fixtures fixtures --latencia-ms 80 --taxa-429 0.05
+    SCRYFALL_API=http://127.0.0.1:8765 python card_search.py
+"""
+import os
+import json
+import time
+import base64
+import random
+import hashlib
+import argparse
+import threading
+import contextlib
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlsplit, parse_qs, urlencode
+
+# Hosts do Scryfall e o prefixo local usado para cada um nas URLs reescritas
+HOSTS_SCRYFALL = {
+    "api.scryfall.com": "",
+    "cards.scryfall.io": "/_imagens",
+}
+
+# PNG 1x1 usado como imagem no modo sintético
+_PNG_SINTETICO = base64.b64decode(
+    "iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAYAAAAfFcSJAAAADUlEQVR42mNk+M9QDwADhgGAWjR9awAAAABJRU5ErkJggg=="
+)
+
+def chave_requisicao(metodo, host, caminho, query, corpo=b""):
+    """Identifica uma requisição de forma estável (query ordenada + hash do corpo)."""
+    query_ordenada = urlencode(sorted(parse_qs(query).items()), doseq=True)
+    texto = f"{metodo} {host}{caminho}?{query_ordenada}".encode("utf-8") + b"\n" + corpo
+    return hashlib.sha1(texto).hexdigest()
+
+class Fixtures:
+    """Fixtures gravadas em disco: um arquivo JSON por requisição."""
+    def __init__(self, pasta):
+        self.pasta = pasta
+
+    def _caminho(self, chave):
+        return os.path.join(self.pasta, chave[:2], chave + ".json")
+
+    def obter(self, chave):
+        try:
+            with open(self._caminho(chave), "r", encoding="utf-8") as f:
+                fixture = json.load(f)
+        except (OSError, ValueError):
+            return None
+        return fixture["status"], fixture["headers"], base64.b64decode(fixture["corpo_b64"])
+
+    def gravar(self, chave, requisicao, status, headers, corpo):
+        caminho = self._caminho(chave)
+        os.makedirs(os.path.dirname(caminho), exist_ok=True)
+        with open(caminho, "w", encoding="utf-8") as f:
+            json.dump({
+                "requisicao": requisicao,
+                "status": status,
+                "headers": headers,
+                "corpo_b64": base64.b64encode(corpo).decode("ascii"),
+            }, f, indent=1)
+
+class Falhas:
+    """
+    Configuração da injeção de falhas. As taxas são probabilidades por requisição.
+
+    Parâmetros:
+      - latencia_ms: Latência fixa adicionada a cada resposta.
+      - variacao_ms: Variação aleatória (uniforme) somada à latência.
+      - taxa_429: Fração de respostas 429 (com cabeçalho Retry-After).
+      - taxa_5xx: Fração de respostas 503.
+      - taxa_truncado: Fração de respostas com o corpo cortado pela metade.
+      - semente: Semente do sorteio, para execuções reprodutíveis.
+    """
+    def __init__(self, latencia_ms=0, variacao_ms=0, taxa_429=0.0, taxa_5xx=0.0, taxa_truncado=0.0, semente=0):
+        self.latencia_ms = latencia_ms
+        self.variacao_ms = variacao_ms
+        self.taxa_429 = taxa_429
+        self.taxa_5xx = taxa_5xx
+        self.taxa_truncado = taxa_truncado
+        self._rng = random.Random(semente)
+        self._lock = threading.Lock()
+
+    def sortear(self):
+        """Retorna (atraso em segundos, falha) onde falha é None, '429', '5xx' ou 'truncado'."""
+        with self._lock:
+            atraso = (self.latencia_ms + self._rng.uniform(0, self.variacao_ms)) / 1000.0
+            r = self._rng.random()
+        if r < self.taxa_429:
+            return atraso, "429"
+        r -= self.taxa_429
+        if r < self.taxa_5xx:
+            return atraso, "5xx"
+        r -= self.taxa_5xx
+        if r < self.taxa_truncado:
+            return atraso, "truncado"
+        return atraso, None
+
+def reescrever_urls(corpo, base_local):
+    """Troca as URLs absolutas do Scryfall pela URL do servidor local."""
+    for host, prefixo in HOSTS_SCRYFALL.items():
+        corpo = corpo.replace(f"https://{host}".encode(), f"{base_local}{prefixo}".encode())
+    return corpo
+
+def _separar_host(caminho):
+    """Converte um caminho local de volta para (host do Scryfall, caminho original)."""
+    for host, prefixo in HOSTS_SCRYFALL.items():
+        if prefixo and caminho.startswith(prefixo + "/"):
+            return host, caminho[len(prefixo):]
+    return "api.scryfall.com", caminho
+
+# ----- respostas sintéticas -----
+
+def _oracle_id_sintetico(nome):
+    h = hashlib.md5(nome.encode("utf-8")).hexdigest()
+    return f"{h[:8]}-{h[8:12]}-{h[12:16]}-{h[16:20]}-{h[20:32]}"
+
+def resposta_sintetica(base_local, metodo, host, caminho, query, corpo, prints_por_carta=12, tamanho_pagina=5):
+    """Gera uma resposta sintética plausível para os endpoints usados pelo card_search."""
+    params = parse_qs(query)
+    if host == "cards.scryfall.io":
+        return 200, {"Content-Type": "image/png"}, _PNG_SINTETICO
+    if caminho == "/cards/named":
+        nome = (params.get("exact") or params.get("fuzzy") or [""])[0]
+        dados = {"object": "card", "name": nome, "oracle_id": _oracle_id_sintetico(nome), "lang": "en"}
+    elif caminho == "/cards/search":
+        oracle_id = params.get("q", [""])[0].split()[0].split(":")[-1]
+        pagina = int(params.get("page", ["1"])[0])
+        inicio = (pagina - 1) * tamanho_pagina
+        fim = min(inicio + tamanho_pagina, prints_por_carta)
+        dados = {"object": "list", "has_more": fim < prints_por_carta, "data": [{
+            "object": "card", "oracle_id": oracle_id, "name": oracle_id,
+            "lang": "en" if i % 2 == 0 else "pt", "set_name": f"Set {i // 2}",
+            "collector_number": str(i), "illustration_id": f"{oracle_id}-{i // 4}",
+            "image_uris": {
+                "small": f"{base_local}/_imagens/small/front/0/0/{oracle_id}.jpg?{i}",
+                "art_crop": f"{base_local}/_imagens/art_crop/front/0/0/{oracle_id}.jpg?{i}",
+                "png": f"{base_local}/_imagens/png/front/0/0/{oracle_id}.png?{i}",
+            },
+        } for i in range(inicio, fim)]}
+        if dados["has_more"]:
+            dados["next_page"] = f"{base_local}/cards/search?" + urlencode({"q": params.get("q", [""])[0], "page": pagina + 1})
+    elif caminho == "/cards/collection" and metodo == "POST":
+        identificadores = json.loads(corpo or b"{}").get("identifiers", [])
+        dados = {"object": "list", "not_found": [], "data": [
+            {"object": "card", "name": i.get("name", ""), "oracle_id": _oracle_id_sintetico(i.get("name", "")), "lang": "en"}
+            for i in identificadores
+        ]}
+    else:
+        return 404, {"Content-Type": "application/json"}, b'{"object": "error", "status": 404}'
+    return 200, {"Content-Type": "application/json"}, json.dumps(dados).encode("utf-8")
+
+# ----- servidor -----
+
+class _Handler(BaseHTTPRequestHandler):
+    fixtures = None
+    falhas = None
+    gravar = False
+    sintetico = False
+    estatisticas = None
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        self._responder("GET")
+
+    def do_HEAD(self):
+        self._responder("HEAD")
+
+    def do_POST(self):
+        self._responder("POST")
+
+    def _base_local(self):
+        return f"http://{self.headers.get('Host', '%s:%d' % self.server.server_address)}"
+
+    def _contar(self, campo):
+        with self.server.lock:
+            self.estatisticas[campo] = self.estatisticas.get(campo, 0) + 1
+
+    def _responder(self, metodo):
+        partes = urlsplit(self.path)
+        tamanho = int(self.headers.get("Content-Length") or 0)
+        corpo_req = self.rfile.read(tamanho) if tamanho else b""
+        host, caminho = _separar_host(partes.path)
+        # HEAD usa a mesma fixture do GET (apenas sem corpo)
+        chave = chave_requisicao("GET" if metodo == "HEAD" else metodo, host, caminho, partes.query, corpo_req)
+        self._contar("requisicoes")
+
+        atraso, falha = self.falhas.sortear()
+        if atraso:
+            time.sleep(atraso)
+        if falha == "429":
+            self._contar("falhas_429")
+            return self._enviar(429, {"Content-Type": "application/json", "Retry-After": "1"},
+                                b'{"object": "error", "status": 429, "code": "rate_limited"}', metodo)
+        if falha == "5xx":
+            self._contar("falhas_5xx")
+            return self._enviar(503, {"Content-Type": "application/json"},
+                                b'{"object": "error", "status": 503}', metodo)
+
+        resposta = self.fixtures.obter(chave) if self.fixtures else None
+        if resposta is None and self.gravar:
+            resposta = self._buscar_upstream(metodo, host, caminho, partes.query, corpo_req, chave)
+        if resposta is None and self.sintetico:
+            resposta = resposta_sintetica(self._base_local(), metodo, host, caminho, partes.query, corpo_req)
+        if resposta is None:
+            self._contar("sem_fixture")
+            return self._enviar(404, {"Content-Type": "application/json"},
+                                b'{"object": "error", "status": 404, "details": "fixture ausente"}', metodo)
+
+        status, headers, corpo = resposta
+        corpo = reescrever_urls(corpo, self._base_local())
+        self._enviar(status, headers, corpo, metodo, truncar=(falha == "truncado"))
+
+    def _buscar_upstream(self, metodo, host, caminho, query, corpo_req, chave):
+        import requests
+        url = f"https://{host}{caminho}" + (f"?{query}" if query else "")
+        headers = {"Accept": self.headers.get("Accept", "*/*"), "User-Agent": "CardSearchApp/1.0"}
+        if corpo_req:
+            headers["Content-Type"] = self.headers.get("Content-Type", "application/json")
+        try:
+            r = requests.request("GET" if metodo == "HEAD" else metodo, url, data=corpo_req or None, headers=headers, timeout=30)
+        except Exception:
+            return None
+        headers_resp = {k: v for k, v in r.headers.items() if k.lower() in ("content-type", "retry-after")}
+        # Respostas 429/5xx reais não são gravadas: a injeção de falhas cuida delas
+        if r.status_code < 429 or r.status_code == 404:
+            requisicao = {"metodo": metodo, "url": url, "corpo": corpo_req.decode("utf-8", "replace")}
+            self.fixtures.gravar(chave, requisicao, r.status_code, headers_resp, r.content)
+            self._contar("gravadas")
+        return r.status_code, headers_resp, r.content
+
+    def _enviar(self, status, headers, corpo, metodo, truncar=False):
+        self.send_response(status)
+        for nome, valor in headers.items():
+            self.send_header(nome, valor)
+        self.send_header("Content-Length", str(len(corpo)))
+        self.end_headers()
+        if metodo == "HEAD":
+            return
+        if truncar:
+            self._contar("falhas_truncado")
+            # Anuncia o tamanho completo, envia metade e fecha a conexão
+            self.wfile.write(corpo[:len(corpo) // 2])
+            self.wfile.flush()
+            self.close_connection = True
+            return
+        self.wfile.write(corpo)
+
+def criar_servidor(pasta_fixtures=None, host="127.0.0.1", porta=0, gravar=False, sintetico=False, falhas=None):
+    """
+    Cria (sem iniciar) o servidor substituto do Scryfall. Use porta=0 para uma porta livre.
+    O atributo 'estatisticas' do servidor conta requisições, falhas injetadas e fixtures gravadas.
+    O modo de gravação exige 'pasta_fixtures' (ValueError caso contrário).
+    """
+    if gravar and not pasta_fixtures:
+        raise ValueError("O modo de gravação exige uma pasta de fixtures (pasta_fixtures).")
+    handler = type("Handler", (_Handler,), {
+        "fixtures": Fixtures(pasta_fixtures) if pasta_fixtures else None,
+        "falhas": falhas or Falhas(),
+        "gravar": gravar,
+        "sintetico": sintetico,
+        "estatisticas": {},
+    })
+    servidor = ThreadingHTTPServer((host, porta), handler)
+    servidor.daemon_threads = True
+    servidor.lock = threading.Lock()
+    servidor.estatisticas = handler.estatisticas
+    return servidor
+
+@contextlib.contextmanager
+def servidor_local(pasta_fixtures=None, gravar=False, sintetico=False, falhas=None):
+    """Sobe o servidor em uma thread e retorna a URL base (para SCRYFALL_API)."""
+    servidor = criar_servidor(pasta_fixtures, gravar=gravar, sintetico=sintetico, falhas=falhas)
+    thread = threading.Thread(target=servidor.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield f"http://127.0.0.1:{servidor.server_address[1]}"
+    finally:
+        servidor.shutdown()
+        servidor.server_close()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Servidor local substituto da API do Scryfall.")
+    parser.add_argument("--fixtures", default="fixtures", help="Pasta das fixtures gravadas.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--porta", type=int, default=8765)
+    parser.add_argument("--gravar", action="store_true", help="Repassa ao Scryfall real e grava as respostas ausentes.")
+    parser.add_argument("--sintetico", action="store_true", help="Gera respostas sintéticas quando não há fixture.")
+    parser.add_argument("--latencia-ms", type=float, default=0)
+    parser.add_argument("--variacao-ms", type=float, default=0)
+    parser.add_argument("--taxa-429", type=float, default=0.0)
+    parser.add_argument("--taxa-5xx", type=float, default=0.0)
+    parser.add_argument("--taxa-truncado", type=float, default=0.0)
+    parser.add_argument("--semente", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    falhas = Falhas(args.latencia_ms, args.variacao_ms, args.taxa_429, args.taxa_5xx, args.taxa_truncado, args.semente)
+    servidor = criar_servidor(args.fixtures, args.host, args.porta, args.gravar, args.sintetico, falhas)
+    print(f"Servidor Scryfall local em http://{args.host}:{servidor.server_address[1]} (fixtures: {args.fixtures})")
+    try:
+        servidor.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        servidor.server_close()
+        print(f"Estatísticas: {json.dumps(servidor.estatisticas)}")
+
+if __name__ == "__main__":
+    main()
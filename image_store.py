@@ -0,0 +1,415 @@
+import os
+import re
+import json
+import time
+import shutil
+import logging
+import hashlib
+import threading
+import contextlib
+from urllib.parse import urlsplit
+
+from lazy_import import importar_sob_demanda
+import tracing
+
+requests = importar_sob_demanda("requests")
+
+logger = logging.getLogger(__name__)
+
+# Pasta raiz do armazenamento local de imagens (compartilhado entre jobs)
+STORE_DIR = os.path.join(".cache", "store")
+
+# Número de jobs em que uma imagem precisa ser usada para ficar fixada no armazenamento
+LIMIAR_FIXACAO_PADRAO = 3
+
+# Número máximo de imagens originais fixadas automaticamente (uma coleção de alguns
+# milhares de cartas) e o espaço reservado a elas (cerca de 2 MB por PNG do Scryfall);
+# as menos usadas além desses limites voltam a ser tratadas como imagens comuns pela
+# coleta de lixo
+LIMITE_FIXADAS_PADRAO = 3000
+LIMITE_FIXADAS_BYTES_PADRAO = 6 * 1024 * 1024 * 1024
+
+# Limite padrão de tamanho do armazenamento: o espaço das imagens fixadas mais 2 GB
+# para as demais (downloads e conversões dos jobs recentes)
+LIMITE_PADRAO_BYTES = LIMITE_FIXADAS_BYTES_PADRAO + 2 * 1024 * 1024 * 1024
+
+# Intervalo mínimo (em segundos) para regravar o último uso de um objeto no índice:
+# a ordem LRU não precisa de mais precisão que isso, e uma consulta não regrava o índice
+INTERVALO_ULTIMO_USO = 3600
+
+# URLs de imagem do Scryfall: /<formato>/<face>/<x>/<y>/<id>.<ext>?<versão>
+_PADRAO_URL_SCRYFALL = re.compile(r'/(\w+)/(front|back)/\w/\w/([0-9a-f\-]{36})\.(\w+)$')
+
+def chave_da_url(url):
+    """
+    Retorna a chave de armazenamento de uma URL de imagem.
+    Para URLs do Scryfall a chave é formada pelo id da imagem, face, formato e versão;
+    para outras URLs, pelo hash SHA-1 da URL completa.
+    """
+    partes = urlsplit(url)
+    match = _PADRAO_URL_SCRYFALL.search(partes.path)
+    if match:
+        formato, face, image_id, _ = match.groups()
+        versao = re.sub(r'\W', '', partes.query)
+        chave = f"{image_id}-{face}-{formato}"
+        return f"{chave}-{versao}" if versao else chave
+    return hashlib.sha1(url.encode("utf-8")).hexdigest()
+
+def hash_arquivo(caminho):
+    """Retorna o hash SHA-1 do conteúdo de um arquivo."""
+    h = hashlib.sha1()
+    with open(caminho, "rb") as f:
+        for bloco in iter(lambda: f.read(1024 * 1024), b""):
+            h.update(bloco)
+    return h.hexdigest()
+
+def extensao_da_url(url):
+    return os.path.splitext(urlsplit(url).path)[1] or ".png"
+
+@contextlib.contextmanager
+def _bloqueio_arquivo(caminho):
+    """Trava exclusiva entre processos (flock no POSIX, msvcrt.locking no Windows)."""
+    os.makedirs(os.path.dirname(caminho) or ".", exist_ok=True)
+    with open(caminho, "a+b") as f:
+        if os.name == "nt":
+            import msvcrt
+            f.seek(0)
+            msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+            try:
+                yield
+            finally:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+        else:
+            import fcntl
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+class ImageStore:
+    """
+    Armazenamento local de imagens endereçado por conteúdo, compartilhado pelas etapas
+    de busca, conversão e PDF.
+
+    Cada imagem é guardada uma única vez em 'raiz/objetos', identificada pela sua chave
+    (id/versão da imagem no Scryfall ou hash do conteúdo). As pastas de trabalho
+    ('imagens/', 'cartas/') recebem apenas vistas: hard links para os objetos, ou
+    symlinks/cópias quando o sistema de arquivos não permite hard links.
+
+    O índice registra, por objeto, as vistas existentes (contagem de referências),
+    o último uso e o número de jobs em que foi usado (no máximo um uso por job; ver
+    novo_job). A coleta de lixo remove, em ordem LRU, objetos sem vistas até o
+    armazenamento caber em 'limite_bytes'. Imagens originais usadas em 'limiar_fixacao'
+    jobs ou mais ficam fixadas, das mais usadas para as menos usadas, enquanto couberem
+    em 'limite_fixadas' imagens e 'limite_fixadas_bytes' (nunca mais que 'limite_bytes');
+    objetos derivados (conversões, que podem ser refeitas a partir do original) nunca são
+    fixados. Objetos fixados não são removidos, mas, como cabem no limite, a coleta só
+    termina acima de 'limite_bytes' se as vistas dos jobs ocuparem o restante.
+
+    O índice é compartilhado entre processos (busca e gerador de PDF): toda operação
+    trava 'indice.lock', relê o índice se outro processo o alterou e grava o resultado
+    antes de liberar a trava. Operações feitas em sequência (uma por carta) devem ser
+    agrupadas com lote(), para que o índice seja gravado uma única vez.
+
+    Parâmetros:
+      - raiz: Pasta raiz do armazenamento.
+      - limite_bytes: Tamanho máximo do armazenamento antes da coleta de lixo.
+      - limiar_fixacao: Número de jobs para fixar uma imagem (None desativa).
+      - limite_fixadas: Número máximo de imagens fixadas automaticamente.
+      - limite_fixadas_bytes: Espaço máximo ocupado pelas imagens fixadas automaticamente.
+    """
+    def __init__(self, raiz=STORE_DIR, limite_bytes=LIMITE_PADRAO_BYTES, limiar_fixacao=LIMIAR_FIXACAO_PADRAO,
+                 limite_fixadas=LIMITE_FIXADAS_PADRAO, limite_fixadas_bytes=LIMITE_FIXADAS_BYTES_PADRAO):
+        self.raiz = raiz
+        self.limite_bytes = limite_bytes
+        self.limiar_fixacao = limiar_fixacao
+        self.limite_fixadas = limite_fixadas
+        self.limite_fixadas_bytes = limite_fixadas_bytes
+        self.pasta_objetos = os.path.join(raiz, "objetos")
+        self.caminho_indice = os.path.join(raiz, "indice.json")
+        self.caminho_trava = os.path.join(raiz, "indice.lock")
+        self._lock = threading.RLock()
+        self._indice = None
+        self._estado_indice = None  # (inode, mtime, tamanho) do índice lido por último
+        self._profundidade = 0
+        self._alterado = False
+        self._trava = None
+        self.novo_job()
+
+    def novo_job(self):
+        """Inicia um novo job: cada objeto conta no máximo um uso por job."""
+        self.job = f"{os.getpid()}-{time.time_ns()}"
+
+    # ----- índice -----
+
+    @contextlib.contextmanager
+    def _transacao(self):
+        """
+        Seção crítica sobre o índice, reentrante: a primeira entrada trava o arquivo de
+        trava e relê o índice se ele mudou em disco; a última grava as alterações.
+        """
+        with self._lock:
+            if self._profundidade == 0:
+                self._trava = _bloqueio_arquivo(self.caminho_trava)
+                self._trava.__enter__()
+                try:
+                    self._recarregar()
+                except BaseException:
+                    trava, self._trava = self._trava, None
+                    trava.__exit__(None, None, None)
+                    raise
+            self._profundidade += 1
+            try:
+                yield
+            finally:
+                self._profundidade -= 1
+                if self._profundidade == 0:
+                    try:
+                        if self._alterado:
+                            self._gravar()
+                    finally:
+                        self._alterado = False
+                        trava, self._trava = self._trava, None
+                        trava.__exit__(None, None, None)
+
+    def lote(self):
+        """
+        Agrupa várias operações (ex.: um vincular por carta de um job) numa única transação:
+        o índice é travado e relido uma vez e gravado só ao final, em vez de a cada operação.
+        Outros processos e threads que usam o armazenamento esperam até o fim do lote.
+        """
+        return self._transacao()
+
+    def _estado_arquivo_indice(self):
+        try:
+            estado = os.stat(self.caminho_indice)
+        except OSError:
+            return None
+        return (estado.st_ino, estado.st_mtime_ns, estado.st_size)
+
+    def _recarregar(self):
+        # Relê o índice apenas se outro processo (ou instância) o regravou
+        estado = self._estado_arquivo_indice()
+        if self._indice is not None and estado == self._estado_indice:
+            return
+        try:
+            with open(self.caminho_indice, "r", encoding="utf-8") as f:
+                self._indice = json.load(f)
+        except (OSError, ValueError):
+            self._indice = {}
+        self._estado_indice = estado
+
+    def _carregar(self):
+        with self._transacao():
+            return self._indice
+
+    def _salvar(self):
+        # A gravação acontece ao sair da transação mais externa
+        self._alterado = True
+
+    def _gravar(self):
+        os.makedirs(self.raiz, exist_ok=True)
+        temporario = self.caminho_indice + ".tmp"
+        with open(temporario, "w", encoding="utf-8") as f:
+            json.dump(self._indice, f)
+        os.replace(temporario, self.caminho_indice)
+        self._estado_indice = self._estado_arquivo_indice()
+
+    def _caminho_objeto(self, chave, extensao):
+        return os.path.join(self.pasta_objetos, chave[:2], chave + extensao)
+
+    # ----- objetos -----
+
+    def caminho(self, chave):
+        """
+        Retorna o caminho do objeto 'chave' no armazenamento, ou None se não existir.
+        O último uso é atualizado em memória; o índice só é regravado por isso quando o
+        valor gravado tem mais de INTERVALO_ULTIMO_USO segundos.
+        """
+        with self._transacao():
+            entrada = self._carregar().get(chave)
+            if not entrada:
+                return None
+            caminho = os.path.join(self.raiz, entrada["arquivo"])
+            if not os.path.exists(caminho):
+                del self._indice[chave]
+                self._salvar()
+                return None
+            agora = time.time()
+            if agora - entrada["ultimo_uso"] > INTERVALO_ULTIMO_USO:
+                self._salvar()
+            entrada["ultimo_uso"] = agora
+            return caminho
+
+    def adicionar(self, chave, origem, extensao=None, mover=False, derivada=False):
+        """
+        Adiciona o arquivo 'origem' ao armazenamento com a chave indicada e retorna
+        o caminho do objeto. Se 'mover' for True o arquivo de origem é movido.
+        'derivada' marca objetos gerados a partir de outro (ex.: conversões), que não
+        são fixados por uso.
+        """
+        extensao = extensao or os.path.splitext(origem)[1] or ".png"
+        with self._transacao():
+            existente = self.caminho(chave)
+            if existente:
+                if mover:
+                    os.remove(origem)
+                return existente
+            destino = self._caminho_objeto(chave, extensao)
+            os.makedirs(os.path.dirname(destino), exist_ok=True)
+            if mover:
+                os.replace(origem, destino)
+            else:
+                shutil.copyfile(origem, destino)
+            self._carregar()[chave] = {
+                "arquivo": os.path.relpath(destino, self.raiz),
+                "tamanho": os.path.getsize(destino),
+                "ultimo_uso": time.time(),
+                "usos": 0,
+                "derivada": derivada,
+                "vistas": [],
+            }
+            self._salvar()
+            return destino
+
+    def baixar(self, url, chave=None):
+        """
+        Retorna o caminho local da imagem da URL, baixando-a apenas se ela ainda não
+        estiver no armazenamento. Retorna None em caso de falha.
+        """
+        chave = chave or chave_da_url(url)
+        existente = self.caminho(chave)
+        if existente:
+            tracing.contar("store.acertos")
+            return existente
+        tracing.contar("store.faltas")
+        os.makedirs(self.raiz, exist_ok=True)
+        temporario = os.path.join(self.raiz, f"{chave}.{threading.get_ident()}.part")
+        try:
+            with tracing.etapa("download", url=url) as attrs:
+                response = requests.get(url, stream=True, timeout=30)
+                if response.status_code != 200:
+                    return None
+                with open(temporario, "wb") as f:
+                    for chunk in response.iter_content(16 * 1024):
+                        f.write(chunk)
+                attrs["bytes_entrada"] = os.path.getsize(temporario)
+            return self.adicionar(chave, temporario, extensao_da_url(url), mover=True)
+        except Exception:
+            if os.path.exists(temporario):
+                os.remove(temporario)
+            return None
+
+    # ----- vistas por job -----
+
+    def vincular(self, chave, destino):
+        """
+        Cria em 'destino' uma vista do objeto 'chave' (hard link, symlink ou cópia)
+        e registra a referência. Retorna o caminho de destino, ou None se a chave não existir.
+        """
+        with self._transacao():
+            origem = self.caminho(chave)
+            if not origem:
+                return None
+            pasta = os.path.dirname(destino)
+            if pasta:
+                os.makedirs(pasta, exist_ok=True)
+            if os.path.lexists(destino):
+                os.remove(destino)
+            try:
+                os.link(origem, destino)
+            except OSError:
+                try:
+                    os.symlink(os.path.abspath(origem), destino)
+                except OSError:
+                    shutil.copyfile(origem, destino)
+            entrada = self._indice[chave]
+            destino_abs = os.path.abspath(destino)
+            if destino_abs not in entrada["vistas"]:
+                entrada["vistas"].append(destino_abs)
+            if entrada.get("ultimo_job") != self.job:
+                entrada["usos"] += 1
+                entrada["ultimo_job"] = self.job
+            self._salvar()
+            return destino
+
+    def referencias(self, chave):
+        """Retorna o número de vistas ainda existentes do objeto 'chave'."""
+        with self._transacao():
+            entrada = self._carregar().get(chave)
+            if not entrada:
+                return 0
+            entrada["vistas"] = [v for v in entrada["vistas"] if os.path.lexists(v)]
+            return len(entrada["vistas"])
+
+    def tamanho_total(self):
+        with self._transacao():
+            return sum(e["tamanho"] for e in self._carregar().values())
+
+    def fixadas_automaticamente(self, limite_bytes=None):
+        """
+        Retorna as chaves fixadas por uso: imagens originais (não derivadas) usadas em pelo
+        menos 'limiar_fixacao' jobs, das mais usadas para as menos usadas, enquanto couberem
+        em 'limite_fixadas' imagens e em 'limite_fixadas_bytes' (no máximo 'limite_bytes',
+        ou o limite informado).
+        """
+        if not self.limiar_fixacao:
+            return set()
+        limite = self.limite_bytes if limite_bytes is None else limite_bytes
+        orcamento = min(self.limite_fixadas_bytes, limite)
+        with self._transacao():
+            indice = self._indice
+            populares = sorted(
+                (chave for chave, e in indice.items()
+                 if e["usos"] >= self.limiar_fixacao and not e["derivada"]),
+                key=lambda chave: (indice[chave]["usos"], indice[chave]["ultimo_uso"]),
+                reverse=True
+            )
+            fixadas = set()
+            ocupado = 0
+            for chave in populares:
+                if len(fixadas) >= self.limite_fixadas:
+                    break
+                tamanho = indice[chave]["tamanho"]
+                if ocupado + tamanho <= orcamento:
+                    fixadas.add(chave)
+                    ocupado += tamanho
+            return fixadas
+
+    def coletar_lixo(self, limite_bytes=None):
+        """
+        Remove objetos sem referências e não fixados, do menos para o mais recentemente
+        usado, até o armazenamento caber no limite. Retorna o número de bytes liberados.
+        """
+        limite = self.limite_bytes if limite_bytes is None else limite_bytes
+        liberado = 0
+        with self._transacao():
+            indice = self._indice
+            total = self.tamanho_total()
+            if total <= limite:
+                return 0
+            fixadas = self.fixadas_automaticamente(limite)
+            candidatos = sorted(
+                (chave for chave in indice if chave not in fixadas),
+                key=lambda chave: indice[chave]["ultimo_uso"]
+            )
+            for chave in candidatos:
+                if total <= limite:
+                    break
+                if self.referencias(chave):
+                    continue
+                entrada = indice.pop(chave)
+                try:
+                    os.remove(os.path.join(self.raiz, entrada["arquivo"]))
+                except OSError:
+                    pass
+                total -= entrada["tamanho"]
+                liberado += entrada["tamanho"]
+            self._salvar()
+        if total > limite:
+            # As fixadas cabem no limite: só as vistas dos jobs atuais podem ocupar o restante
+            logger.warning("Armazenamento acima do limite após a coleta (%d de %d bytes): "
+                           "imagens em uso pelas pastas de trabalho.", total, limite)
+        return liberado
@@ -0,0 +1,275 @@
+import math
+
+# Tamanhos de papel suportados (largura x altura em mm, orientação retrato)
+PAPEIS_MM = {
+    "A4": (210.0, 297.0),
+    "LETTER": (215.9, 279.4),
+    "A3": (297.0, 420.0),
+}
+
+# Folga numérica para comparações em mm
+_EPS = 1e-6
+
+def tamanho_papel(papel):
+    """
+    Retorna (largura, altura) em mm para 'papel', que pode ser o nome de um tamanho
+    conhecido ("A4", "Letter", "A3") ou uma tupla (largura_mm, altura_mm) personalizada.
+    """
+    if isinstance(papel, str):
+        try:
+            return PAPEIS_MM[papel.upper()]
+        except KeyError:
+            raise ValueError(f"Papel desconhecido: '{papel}'. Use {', '.join(PAPEIS_MM)} ou (largura_mm, altura_mm).")
+    largura, altura = papel
+    return float(largura), float(altura)
+
+class Posicao:
+    """
+    Posição de uma carta na folha, em mm com origem no canto inferior esquerdo.
+    (x, y, largura, altura) é a célula completa, incluindo a sangria; se 'rotacionada'
+    for True a carta é desenhada girada 90° (a célula fica deitada).
+    """
+    def __init__(self, x, y, largura, altura, rotacionada=False):
+        self.x = x
+        self.y = y
+        self.largura = largura
+        self.altura = altura
+        self.rotacionada = rotacionada
+
+    def __repr__(self):
+        giro = ", rotacionada" if self.rotacionada else ""
+        return f"Posicao(x={self.x:.2f}, y={self.y:.2f}, {self.largura:.2f}x{self.altura:.2f}{giro})"
+
+class Layout:
+    """
+    Resultado da imposição: tamanho da folha, posições das cartas (na ordem de
+    preenchimento) e os segmentos das linhas de corte, todos em mm.
+    """
+    def __init__(self, papel_mm, posicoes, sangria_mm, regioes, descricao):
+        self.papel_mm = papel_mm
+        self.posicoes = posicoes
+        self.sangria_mm = sangria_mm
+        self.regioes = regioes
+        self.descricao = descricao
+
+    @property
+    def cartas_por_folha(self):
+        return len(self.posicoes)
+
+    def linhas_corte(self):
+        """
+        Retorna os segmentos (x0, y0, x1, y1) das linhas de corte, nas bordas de refile
+        (sem a sangria) de cada carta. Cada linha atravessa a sua região e se estende até
+        a borda da folha, parando antes de entrar em outra região de cartas.
+        """
+        largura_papel, altura_papel = self.papel_mm
+        b = self.sangria_mm
+        segmentos = set()
+        for indice, (rx0, ry0, rx1, ry1) in enumerate(self.regioes):
+            outras = [r for i, r in enumerate(self.regioes) if i != indice]
+            celulas = [p for p in self.posicoes if _dentro(p, (rx0, ry0, rx1, ry1))]
+            xs = sorted({round(v, 4) for p in celulas for v in (p.x + b, p.x + p.largura - b)})
+            ys = sorted({round(v, 4) for p in celulas for v in (p.y + b, p.y + p.altura - b)})
+            for x in xs:
+                baixo = max([oy1 for ox0, oy0, ox1, oy1 in outras if ox0 < x < ox1 and oy1 <= ry0 + _EPS], default=0.0)
+                cima = min([oy0 for ox0, oy0, ox1, oy1 in outras if ox0 < x < ox1 and oy0 >= ry1 - _EPS], default=altura_papel)
+                segmentos.add((x, baixo, x, cima))
+            for y in ys:
+                esquerda = max([ox1 for ox0, oy0, ox1, oy1 in outras if oy0 < y < oy1 and ox1 <= rx0 + _EPS], default=0.0)
+                direita = min([ox0 for ox0, oy0, ox1, oy1 in outras if oy0 < y < oy1 and ox0 >= rx1 - _EPS], default=largura_papel)
+                segmentos.add((esquerda, y, direita, y))
+        return sorted(segmentos)
+
+def _dentro(posicao, regiao):
+    x0, y0, x1, y1 = regiao
+    return (posicao.x >= x0 - _EPS and posicao.y >= y0 - _EPS
+            and posicao.x + posicao.largura <= x1 + _EPS and posicao.y + posicao.altura <= y1 + _EPS)
+
+def _grade(largura_disponivel, altura_disponivel, celula_l, celula_a, gutter):
+    """Quantas colunas e linhas de células cabem na área, com 'gutter' entre elas."""
+    if largura_disponivel < celula_l - _EPS or altura_disponivel < celula_a - _EPS:
+        return 0, 0
+    colunas = int((largura_disponivel + gutter + _EPS) // (celula_l + gutter))
+    linhas = int((altura_disponivel + gutter + _EPS) // (celula_a + gutter))
+    return colunas, linhas
+
+def _extensao(n, celula, gutter):
+    return n * celula + max(0, n - 1) * gutter
+
+def _posicoes_grade(x0, y_topo, colunas, linhas, celula_l, celula_a, gutter, rotacionada):
+    """Posições de uma grade preenchida linha a linha, da esquerda para a direita e de cima para baixo."""
+    posicoes = []
+    for linha in range(linhas):
+        y = y_topo - (linha + 1) * celula_a - linha * gutter
+        for coluna in range(colunas):
+            x = x0 + coluna * (celula_l + gutter)
+            posicoes.append(Posicao(x, y, celula_l, celula_a, rotacionada))
+    return posicoes
+
+def calcular_layout(papel="A4", largura_carta_mm=63.0, altura_carta_mm=88.0, gutter_mm=0.0,
+                    sangria_mm=0.0, margem_mm=5.0, colunas=None, linhas=None, permitir_rotacao=True):
+    """
+    Escolhe a imposição que coloca mais cartas por folha.
+
+    São avaliadas a grade com as cartas em pé e a grade com as cartas deitadas (giradas
+    90°), cada uma opcionalmente completada por uma faixa, à direita ou embaixo, com
+    cartas na outra orientação aproveitando a sobra da folha. O conjunto é centralizado.
+    Em caso de empate vence o layout mais simples (sem rotação e sem faixa extra).
+
+    Parâmetros:
+      - papel: "A4", "Letter", "A3" ou (largura_mm, altura_mm).
+      - largura_carta_mm, altura_carta_mm: Tamanho da carta refilada.
+      - gutter_mm: Espaço entre as células.
+      - sangria_mm: Sangria em cada lado da carta (a célula fica 2x sangria maior).
+      - margem_mm: Margem mínima em relação à borda da folha (área não imprimível).
+      - colunas, linhas: Se informados, força uma grade fixa, sem rotação (comportamento antigo).
+      - permitir_rotacao: Se False, as cartas nunca são giradas.
+    """
+    largura_papel, altura_papel = tamanho_papel(papel)
+    celula_l = largura_carta_mm + 2 * sangria_mm
+    celula_a = altura_carta_mm + 2 * sangria_mm
+    util_l = largura_papel - 2 * margem_mm
+    util_a = altura_papel - 2 * margem_mm
+    g = gutter_mm
+
+    candidatos = []
+    if colunas and linhas:
+        candidatos.append((colunas, linhas, False, None, 0, 0))
+    else:
+        orientacoes = (False, True) if permitir_rotacao else (False,)
+        for rot in orientacoes:
+            cl, ca = (celula_a, celula_l) if rot else (celula_l, celula_a)
+            c1, l1 = _grade(util_l, util_a, cl, ca, g)
+            if not c1 or not l1:
+                continue
+            candidatos.append((c1, l1, rot, None, 0, 0))
+            if not permitir_rotacao:
+                continue
+            # Faixa extra com as cartas na outra orientação
+            ol, oa = ca, cl
+            gw, gh = _extensao(c1, cl, g), _extensao(l1, ca, g)
+            c2, l2 = _grade(util_l - gw - g, util_a, ol, oa, g)
+            if c2 and l2:
+                candidatos.append((c1, l1, rot, "direita", c2, l2))
+            c2, l2 = _grade(util_l, util_a - gh - g, ol, oa, g)
+            if c2 and l2:
+                candidatos.append((c1, l1, rot, "embaixo", c2, l2))
+    if not candidatos:
+        raise ValueError("A carta não cabe na folha com as margens informadas.")
+
+    def pontuacao(candidato):
+        c1, l1, rot, faixa, c2, l2 = candidato
+        return (c1 * l1 + c2 * l2, faixa is None, not rot)
+
+    c1, l1, rot, faixa, c2, l2 = max(candidatos, key=pontuacao)
+    cl, ca = (celula_a, celula_l) if rot else (celula_l, celula_a)
+    gw, gh = _extensao(c1, cl, g), _extensao(l1, ca, g)
+    sw, sh = _extensao(c2, ca, g), _extensao(l2, cl, g)
+    if faixa == "direita":
+        bloco_l, bloco_a = gw + g + sw, max(gh, sh)
+    elif faixa == "embaixo":
+        bloco_l, bloco_a = max(gw, sw), gh + g + sh
+    else:
+        bloco_l, bloco_a = gw, gh
+
+    # Centraliza o bloco de cartas na folha
+    ox = (largura_papel - bloco_l) / 2
+    oy = (altura_papel - bloco_a) / 2
+    topo = oy + bloco_a
+    posicoes = _posicoes_grade(ox, topo, c1, l1, cl, ca, g, rot)
+    regioes = [(ox, topo - gh, ox + gw, topo)]
+    descricao = f"{c1}x{l1}" + (" (cartas deitadas)" if rot else "")
+    if faixa == "direita":
+        x_faixa = ox + gw + g
+        posicoes += _posicoes_grade(x_faixa, topo, c2, l2, ca, cl, g, not rot)
+        regioes.append((x_faixa, topo - sh, x_faixa + sw, topo))
+    elif faixa == "embaixo":
+        posicoes += _posicoes_grade(ox, oy + sh, c2, l2, ca, cl, g, not rot)
+        regioes.append((ox, oy, ox + sw, oy + sh))
+    if faixa:
+        descricao += f" + {c2}x{l2} {'deitadas' if not rot else 'em pé'} ({faixa})"
+    return Layout((largura_papel, altura_papel), posicoes, sangria_mm, regioes, descricao)
+
+def compartilha_folhas(n_cartas, n_tokens, cartas_por_folha, compartilhar=True):
+    """Indica se os tokens devem completar a última folha das cartas (ver distribuir_em_folhas)."""
+    k = cartas_por_folha
+    separadas = math.ceil(n_cartas / k) + math.ceil(n_tokens / k)
+    juntas = math.ceil((n_cartas + n_tokens) / k)
+    return compartilhar and juntas < separadas
+
+def distribuir_em_folhas(cartas, tokens, cartas_por_folha, compartilhar=True):
+    """
+    Distribui cartas e tokens pelas folhas. Retorna uma lista de folhas, cada uma com
+    até 'cartas_por_folha' itens.
+
+    Os tokens normalmente começam em uma folha própria (para serem cortados à parte);
+    com 'compartilhar' ativo, eles completam a última folha das cartas sempre que isso
+    reduzir o número total de folhas.
+    """
+    k = cartas_por_folha
+    if compartilha_folhas(len(cartas), len(tokens), k, compartilhar):
+        itens = list(cartas) + list(tokens)
+        return [itens[i:i + k] for i in range(0, len(itens), k)]
+    folhas = [cartas[i:i + k] for i in range(0, len(cartas), k)]
+    folhas += [tokens[i:i + k] for i in range(0, len(tokens), k)]
+    return folhas
+
+def distribuir_estavel(itens, chaves, folhas_anteriores, cartas_por_folha):
+    """
+    Distribui 'itens' pelas folhas mantendo, sempre que possível, a posição que cada
+    um ocupava em 'folhas_anteriores' (listas de chaves, uma por folha, do PDF anterior).
+
+    'chaves' identifica o conteúdo de cada item (ex.: hash da imagem). Itens que já
+    estavam no PDF anterior ficam na mesma folha e célula; os novos ocupam as células
+    deixadas pelos itens removidos e, depois, as células livres no fim. Buracos que
+    sobrarem (mais remoções que inclusões) são preenchidos com os últimos itens, para
+    não deixar células vazias no meio. Assim trocar algumas cartas altera só as folhas
+    em que elas estão, e não desloca todas as seguintes.
+    """
+    k = cartas_por_folha
+    pendentes = {}
+    for item, chave in zip(itens, chaves):
+        pendentes.setdefault(chave, []).append(item)
+    for fila in pendentes.values():
+        fila.reverse()  # pop() devolve os itens na ordem original
+
+    folhas, livres = [], []
+    for anterior in folhas_anteriores:
+        if not any(pendentes.get(chave) for chave in anterior):
+            continue
+        folha = []
+        for chave in list(anterior)[:k]:
+            if pendentes.get(chave):
+                folha.append(pendentes[chave].pop())
+            else:
+                livres.append((len(folhas), len(folha)))
+                folha.append(None)
+        livres += [(len(folhas), celula) for celula in range(len(folha), k)]
+        folha += [None] * (k - len(folha))
+        folhas.append(folha)
+
+    # Itens novos, na ordem original: primeiro nas células livres, depois em folhas novas
+    restantes = []
+    for item, chave in zip(itens, chaves):
+        if pendentes.get(chave) and pendentes[chave][-1] == item:
+            restantes.append(pendentes[chave].pop())
+    for item in restantes:
+        if not livres:
+            folhas.append([None] * k)
+            livres = [(len(folhas) - 1, celula) for celula in range(k)]
+        folha, celula = livres.pop(0)
+        folhas[folha][celula] = item
+
+    # Fecha os buracos com os últimos itens
+    posicoes = [(f, c) for f in range(len(folhas)) for c in range(k)]
+    inicio, fim = 0, len(posicoes) - 1
+    while True:
+        while inicio < len(posicoes) and folhas[posicoes[inicio][0]][posicoes[inicio][1]] is not None:
+            inicio += 1
+        while fim >= 0 and folhas[posicoes[fim][0]][posicoes[fim][1]] is None:
+            fim -= 1
+        if inicio >= fim:
+            break
+        (fi, ci), (ff, cf) = posicoes[inicio], posicoes[fim]
+        folhas[fi][ci], folhas[ff][cf] = folhas[ff][cf], None
+    return [[item for item in folha if item is not None] for folha in folhas if any(item is not None for item in folha)]
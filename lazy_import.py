@@ -0,0 +1,43 @@
+import importlib
+import threading
+
+class ModuloSobDemanda:
+    """
+    Referência a um módulo que só é importado no primeiro acesso a um atributo.
+    Permite declarar dependências pesadas (tkinter, PIL, numpy, requests, ReportLab)
+    no topo do arquivo sem pagar o custo da importação ao importar o módulo que as usa.
+    """
+    def __init__(self, nome):
+        self._nome = nome
+        self._modulo = None
+
+    def _carregar(self):
+        if self._modulo is None:
+            self._modulo = importlib.import_module(self._nome)
+        return self._modulo
+
+    def __getattr__(self, atributo):
+        return getattr(self._carregar(), atributo)
+
+    def __repr__(self):
+        estado = "carregado" if self._modulo is not None else "não carregado"
+        return f"<módulo sob demanda '{self._nome}' ({estado})>"
+
+def importar_sob_demanda(nome):
+    """Retorna um ModuloSobDemanda para o módulo 'nome' (ex.: "PIL.Image")."""
+    return ModuloSobDemanda(nome)
+
+def precarregar(*modulos):
+    """
+    Importa os módulos sob demanda em uma thread em segundo plano, para que o primeiro
+    uso de cada etapa não espere pela importação. Útil logo depois de a janela aparecer.
+    """
+    def carregar():
+        for modulo in modulos:
+            try:
+                modulo._carregar()
+            except Exception:
+                pass
+    t = threading.Thread(target=carregar, daemon=True)
+    t.start()
+    return t
@@ -1,18 +1,32 @@
 import os
 import sys
-import tkinter as tk
-from tkinter import messagebox, scrolledtext
+import logging
 import subprocess
 import threading
 
+# proxy e pdf carregam numpy, PIL e ReportLab apenas no primeiro uso
+import proxy
+import pdf
 from proxy import converter_para_63x88_mm
 from pdf import criar_pdf_com_cartas, compress_pdf
+from image_store import ImageStore
+from lazy_import import importar_sob_demanda, precarregar
+import tracing
+
+tk = importar_sob_demanda("tkinter")
+messagebox = importar_sob_demanda("tkinter.messagebox")
+scrolledtext = importar_sob_demanda("tkinter.scrolledtext")
 
 # Diretórios e nomes de arquivos
 IMAGES_DIR = "imagens"        # Pasta com as imagens originais
 CONVERTED_DIR = "cartas"      # Pasta com as imagens convertidas pelo proxy.py
 PDF_OUTPUT = "cartas_A4.pdf"
 PDF_COMPRESSED = "cartas_A4_comprimido.pdf"
+TRACE_JSON = "trace.json"        # Trace das etapas (abre em chrome://tracing / Perfetto)
+METRICS_PROM = "metricas.prom"   # Métricas no formato texto do Prometheus
+
+# Armazenamento local compartilhado: as pastas acima contêm apenas vistas dele
+STORE = ImageStore()
 
 def log_message(widget, message):
     """Adiciona uma mensagem ao widget de log e rola para o final."""
@@ -25,12 +39,28 @@ def run_thread(func, *args, **kwargs):
     t.daemon = True
     t.start()
 
+def export_metrics(log_widget):
+    """Grava o trace e as métricas do job atual e mostra o tempo de cada etapa no log."""
+    tracing.exportar_json(TRACE_JSON)
+    tracing.exportar_prometheus(METRICS_PROM)
+    for nome, etapa in sorted(tracing.resumo()["etapas"].items()):
+        if "." not in nome:
+            log_message(log_widget, f"  {nome}: {etapa['total_s']:.2f} s")
+
 def convert_images(log_widget):
     """Converte as imagens originais usando o proxy.py."""
     try:
         log_message(log_widget, "Iniciando conversão de imagens...")
-        converter_para_63x88_mm(IMAGES_DIR, CONVERTED_DIR, dpi=600)
+        # Cada job exporta apenas as próprias medições
+        tracing.limpar()
+        STORE.novo_job()
+        converter_para_63x88_mm(IMAGES_DIR, CONVERTED_DIR, dpi=600, store=STORE)
         log_message(log_widget, "Conversão de imagens concluída.")
+        # Conversões antigas e imagens sem vistas saem ao fim de cada job
+        liberado = STORE.coletar_lixo()
+        if liberado:
+            log_message(log_widget, f"Armazenamento: {liberado / (1024 * 1024):.2f} MB liberados.")
+        export_metrics(log_widget)
     except Exception as e:
         log_message(log_widget, f"Erro na conversão: {e}")
 
@@ -38,6 +68,7 @@ def generate_pdf(log_widget):
     """Gera o PDF usando as imagens convertidas e depois o comprime."""
     try:
         log_message(log_widget, "Iniciando criação do PDF...")
+        tracing.limpar()
         criar_pdf_com_cartas(CONVERTED_DIR, PDF_OUTPUT)
         log_message(log_widget, "PDF gerado. Iniciando compressão...")
         compress_pdf(PDF_OUTPUT, PDF_COMPRESSED, ghostscript_path="gswin64c.exe", settings="/prepress")
@@ -47,6 +78,7 @@ def generate_pdf(log_widget):
             log_message(log_widget, f"PDF comprimido com sucesso. Tamanho: {size_mb:.2f} MB")
         else:
             log_message(log_widget, "PDF comprimido não encontrado após compressão.")
+        export_metrics(log_widget)
     except Exception as e:
         log_message(log_widget, f"Erro na geração do PDF: {e}")
 
@@ -67,7 +99,11 @@ def open_pdf(log_widget):
         log_message(log_widget, f"Erro ao abrir o PDF: {e}")
 
 def clear_folders(log_widget):
-    """Remove todos os arquivos das pastas de imagens originais e convertidas."""
+    """
+    Remove todos os arquivos das pastas de imagens originais e convertidas.
+    As pastas contêm apenas vistas do armazenamento local; as imagens em si só são
+    apagadas pela coleta de lixo, que respeita o limite de tamanho e as imagens fixadas.
+    """
     try:
         for folder in [IMAGES_DIR, CONVERTED_DIR]:
             if os.path.exists(folder):
@@ -82,6 +118,8 @@ def clear_folders(log_widget):
                         log_message(log_widget, f"Removido: {file_path}")
                     except Exception as e:
                         log_message(log_widget, f"Erro ao remover {file_path}: {e}")
+        liberado = STORE.coletar_lixo()
+        log_message(log_widget, f"Armazenamento: {liberado / (1024 * 1024):.2f} MB liberados.")
         log_message(log_widget, "Pastas limpadas com sucesso.")
     except Exception as e:
         log_message(log_widget, f"Erro na limpeza: {e}")
@@ -114,7 +152,10 @@ def create_gui():
     return root
 
 def main():
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
     root = create_gui()
+    # Com a janela já visível, carrega em segundo plano as dependências das etapas
+    root.after(0, lambda: precarregar(proxy.np, proxy.Image, proxy.futures, pdf.canvas, pdf.rl_utils))
     root.mainloop()
 
 if __name__ == "__main__":
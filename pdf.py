@@ -1,78 +1,109 @@
 import os
+import json
+import hashlib
 import re
+import logging
 import subprocess
 import shutil
-from reportlab.pdfgen import canvas
-from reportlab.lib.pagesizes import A4
-from reportlab.lib.units import mm
-from reportlab.lib.utils import ImageReader
+from lazy_import import importar_sob_demanda
+
+import tracing
+import imposition
+from image_store import hash_arquivo
+
+# ReportLab só é importado quando um PDF é gerado
+canvas = importar_sob_demanda("reportlab.pdfgen.canvas")
+units = importar_sob_demanda("reportlab.lib.units")
+rl_utils = importar_sob_demanda("reportlab.lib.utils")
+# Opcional: copia páginas inalteradas na reconstrução incremental
+pypdf = importar_sob_demanda("pypdf")
+
+logger = logging.getLogger(__name__)
+
+# Nome do form XObject com as linhas de corte, compartilhado por todas as páginas
+NOME_FORM_CORTE = "linhas_corte"
+
+# Versão do formato do manifesto (.manifesto.json) gravado ao lado de cada PDF
+VERSAO_MANIFESTO = 1
 
 def criar_pdf_com_cartas(
     pasta_cartas: str,
     pdf_saida: str,
-    colunas: int = 3,
-    linhas: int = 3,
+    colunas: int = None,
+    linhas: int = None,
     largura_carta_mm: float = 63,
-    altura_carta_mm: float = 88
+    altura_carta_mm: float = 88,
+    papel="A4",
+    gutter_mm: float = 0,
+    sangria_mm: float = 0,
+    margem_mm: float = 5,
+    pasta_tokens: str = None,
+    compartilhar_folhas: bool = True,
+    incremental: bool = True
 ):
     """
-    Cria um PDF A4 com as cartas presentes em 'pasta_cartas'. Cada página terá até 9 cartas
-    dispostas em uma grade 3x3, centralizadas na folha. São desenhadas 4 linhas verticais e 4
-    horizontais que se estendem por toda a página, em cor cinza claro.
-    
+    Cria um PDF com as cartas presentes em 'pasta_cartas'. A disposição das cartas na folha
+    é escolhida por imposition.calcular_layout, que testa a grade com as cartas em pé e
+    deitadas (e a combinação das duas) para colocar o máximo de cartas por folha. Em A4,
+    com as dimensões padrão, o resultado é a mesma grade 3x3 centralizada de antes.
+
+    As linhas de corte (cinza claro, nas bordas de refile de cada carta) são gravadas uma
+    única vez como um form XObject e apenas referenciadas em cada página.
+
     Se o nome de uma carta contiver um padrão do tipo "(Nx)" (por exemplo, "(5x)nome.png"),
     essa carta será repetida N vezes no PDF.
-    
+
     Para reduzir o tamanho final do PDF, o script utiliza:
       - Um cache de imagens, para que a mesma imagem seja incorporada apenas uma vez.
       - Compressão de página, habilitada no canvas.
-    
+      - Um único form XObject com as linhas de corte, compartilhado por todas as páginas.
+
+    Ao lado do PDF é gravado um manifesto ("<pdf>.manifesto.json") com o hash das imagens de
+    cada página. Numa nova geração (ex.: o deck trocou algumas cartas), as páginas cujo
+    conteúdo não mudou são copiadas do PDF anterior com pypdf, sem redesenhar nem
+    recomprimir as imagens; só as páginas alteradas são desenhadas. Para isso, cada imagem
+    que continua no deck mantém a folha e a célula que ocupava, e as novas entram nas
+    células liberadas (a ordem alfabética vale só para a primeira geração). Sem pypdf, ou
+    se o PDF não corresponder ao manifesto, o arquivo é reconstruído por completo.
+
     Parâmetros:
       - pasta_cartas: Pasta onde as imagens das cartas estão armazenadas.
       - pdf_saida: Caminho/nome do PDF a ser gerado (ex.: "cartas_A4.pdf").
-      - colunas: Número de colunas da grade (padrão 3).
-      - linhas: Número de linhas da grade (padrão 3).
+      - colunas, linhas: Se informados, força uma grade fixa sem rotação (padrão: automático).
       - largura_carta_mm: Largura da carta em milímetros (padrão 63 mm).
       - altura_carta_mm: Altura da carta em milímetros (padrão 88 mm).
+      - papel: "A4", "Letter", "A3" ou (largura_mm, altura_mm) (padrão "A4").
+      - gutter_mm: Espaço entre as cartas (padrão 0).
+      - sangria_mm: Sangria de cada lado da carta; as imagens devem tê-la (ver proxy.py).
+      - margem_mm: Margem mínima em relação à borda da folha (padrão 5 mm).
+      - pasta_tokens: Pasta opcional com tokens, impressos depois das cartas.
+      - compartilhar_folhas: Permite que os tokens completem a última folha das cartas
+        quando isso economizar uma folha.
+      - incremental: Reaproveita as páginas inalteradas do PDF existente (padrão True).
+    """
+    with tracing.etapa("pdf") as attrs:
+        _criar_pdf(pasta_cartas, pdf_saida, colunas, linhas, largura_carta_mm, altura_carta_mm,
+                   papel, gutter_mm, sangria_mm, margem_mm, pasta_tokens, compartilhar_folhas,
+                   incremental, attrs)
+
+def listar_imagens_expandidas(pasta):
+    """
+    Lista as imagens de 'pasta' em ordem alfabética, repetindo cada arquivo conforme o
+    padrão "(Nx)" presente no nome.
     """
-    print("Iniciando criação do PDF...")
-    
-    # Tamanho da página A4 (em pontos)
-    pagina_largura, pagina_altura = A4
-    print(f"Tamanho da página A4: {pagina_largura:.2f} x {pagina_altura:.2f} pts")
-    
-    # Converte dimensões das cartas para pontos
-    carta_width = largura_carta_mm * mm
-    carta_height = altura_carta_mm * mm
-    print(f"Dimensões da carta: {largura_carta_mm} mm x {altura_carta_mm} mm -> {carta_width:.2f} x {carta_height:.2f} pts")
-    
-    # Dimensão total da grade de cartas
-    grid_width = colunas * carta_width
-    grid_height = linhas * carta_height
-    print(f"Dimensão total da grade: {grid_width:.2f} x {grid_height:.2f} pts")
-    
-    # Margens para centralizar a grade na página A4
-    margem_x = (pagina_largura - grid_width) / 2
-    margem_y = (pagina_altura - grid_height) / 2
-    print(f"Margens calculadas: margem_x = {margem_x:.2f} pts, margem_y = {margem_y:.2f} pts")
-    
-    # Cria o canvas com compressão de página habilitada
-    c = canvas.Canvas(pdf_saida, pagesize=A4, pageCompression=1)
-    print("Canvas criado com compressão habilitada.")
-    
     # Extensões de imagem aceitas
     extensoes = ('.png', '.jpg', '.jpeg', '.tiff', '.bmp')
-    
-    # Lista e ordena os arquivos da pasta das cartas
+
+    # Lista e ordena os arquivos da pasta
     arquivos = sorted([
-        f for f in os.listdir(pasta_cartas)
+        f for f in os.listdir(pasta)
         if f.lower().endswith(extensoes)
     ])
-    print(f"Encontrados {len(arquivos)} arquivos na pasta '{pasta_cartas}'.")
-    
+    logger.info(f"Encontrados {len(arquivos)} arquivos na pasta '{pasta}'.")
+
     # Regex para identificar padrão do tipo "(Nx)" no nome do arquivo
     pattern = re.compile(r'\((\d+)x\)')
-    
+
     # Expande a lista de imagens, repetindo o arquivo conforme o número indicado
     caminhos_imagens = []
     for f in arquivos:
@@ -81,95 +112,351 @@ def criar_pdf_com_cartas(
         if match:
             try:
                 count = int(match.group(1))
-                print(f"Arquivo '{f}' contém padrão de repetição: {count}x")
+                logger.debug("Arquivo '%s' contém padrão de repetição: %dx", f, count)
             except ValueError:
-                print(f"Falha ao interpretar o padrão de repetição em '{f}'. Usando 1x como padrão.")
+                logger.warning("Falha ao interpretar o padrão de repetição em '%s'. Usando 1x como padrão.", f)
                 count = 1
         else:
-            print(f"Arquivo '{f}' não contém padrão de repetição. Adicionando 1 vez.")
+            logger.debug("Arquivo '%s' não contém padrão de repetição. Adicionando 1 vez.", f)
         for _ in range(count):
-            caminhos_imagens.append(os.path.join(pasta_cartas, f))
-    print(f"Total de imagens após expansão: {len(caminhos_imagens)}")
-    
-    total_cartas_por_pagina = colunas * linhas
-    print(f"Cada página terá até {total_cartas_por_pagina} cartas.")
-    
+            caminhos_imagens.append(os.path.join(pasta, f))
+    return caminhos_imagens
+
+def _definir_linhas_corte(c, layout):
+    """Grava as linhas de corte do layout como um form XObject reutilizável."""
+    c.beginForm(NOME_FORM_CORTE)
+    c.setLineWidth(0.5)
+    c.setStrokeColorRGB(0.8, 0.8, 0.8)
+    for x0, y0, x1, y1 in layout.linhas_corte():
+        c.line(x0 * units.mm, y0 * units.mm, x1 * units.mm, y1 * units.mm)
+    c.endForm()
+
+def _desenhar_carta(c, img_obj, posicao):
+    """Desenha a imagem na célula, girando-a 90° quando a célula está deitada."""
+    x, y = posicao.x * units.mm, posicao.y * units.mm
+    largura, altura = posicao.largura * units.mm, posicao.altura * units.mm
+    if not posicao.rotacionada:
+        c.drawImage(img_obj, x, y, width=largura, height=altura,
+                    preserveAspectRatio=True, anchor='c', mask='auto')
+        return
+    # A carta em pé (altura x largura) é girada para ocupar a célula deitada
+    c.saveState()
+    c.translate(x + largura, y)
+    c.rotate(90)
+    c.drawImage(img_obj, 0, 0, width=altura, height=largura,
+                preserveAspectRatio=True, anchor='c', mask='auto')
+    c.restoreState()
+
+def caminho_manifesto(pdf_saida):
+    """Caminho do manifesto que descreve o conteúdo de cada página de 'pdf_saida'."""
+    return pdf_saida + ".manifesto.json"
+
+def _carregar_manifesto(pdf_saida):
+    try:
+        with open(caminho_manifesto(pdf_saida), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def _salvar_manifesto(pdf_saida, manifesto):
+    caminho = caminho_manifesto(pdf_saida)
+    temporario = caminho + ".tmp"
+    with open(temporario, "w", encoding="utf-8") as f:
+        json.dump(manifesto, f)
+    os.replace(temporario, caminho)
+
+def _estado_arquivo(caminho):
+    estado = os.stat(caminho)
+    return {"tamanho": estado.st_size, "mtime_ns": estado.st_mtime_ns}
+
+def _hashes_imagens(caminhos, arquivos_antigos):
+    """
+    Retorna {caminho: {tamanho, mtime_ns, hash}} para as imagens. O hash do conteúdo só é
+    recalculado quando o tamanho ou a data de modificação mudaram desde o último manifesto.
+    """
+    arquivos = {}
+    for caminho in caminhos:
+        try:
+            estado = _estado_arquivo(caminho)
+        except OSError:
+            continue
+        antigo = arquivos_antigos.get(caminho)
+        if antigo and antigo["tamanho"] == estado["tamanho"] and antigo["mtime_ns"] == estado["mtime_ns"]:
+            estado["hash"] = antigo["hash"]
+        else:
+            estado["hash"] = hash_arquivo(caminho)
+        arquivos[caminho] = estado
+    return arquivos
+
+def _paginas_reaproveitaveis(manifesto, assinatura, pdf_saida):
+    """
+    Retorna {conteúdo da página: índice no PDF existente} para as páginas que podem ser
+    copiadas do PDF anterior, ou {} se ele não corresponder ao manifesto.
+    """
+    if not manifesto or manifesto.get("assinatura") != assinatura or not os.path.exists(pdf_saida):
+        return {}
+    if manifesto.get("pdf") != _estado_arquivo(pdf_saida):
+        logger.info("O PDF existente foi alterado fora do gerador; ele será reconstruído por completo.")
+        return {}
+    return {tuple(pagina): indice for indice, pagina in reversed(list(enumerate(manifesto["paginas"])))}
+
+def _novo_canvas(pdf_saida, layout):
+    pagina_largura, pagina_altura = (v * units.mm for v in layout.papel_mm)
+    # Cria o canvas com compressão de página habilitada
+    c = canvas.Canvas(pdf_saida, pagesize=(pagina_largura, pagina_altura), pageCompression=1)
+    _definir_linhas_corte(c, layout)
+    return c
+
+def _desenhar_paginas(c, layout, folhas):
+    """Desenha cada folha (lista de caminhos de imagem) como uma página do canvas."""
     # Cache de imagens para evitar repetição desnecessária no PDF
     image_cache = {}
-    
-    # Processa as imagens em grupos (cada grupo corresponde a uma página A4)
-    num_paginas = 0
-    for i in range(0, len(caminhos_imagens), total_cartas_por_pagina):
-        num_paginas += 1
-        grupo = caminhos_imagens[i:i + total_cartas_por_pagina]
-        print(f"\nProcessando página {num_paginas} com {len(grupo)} cartas...")
-    
-        # Posiciona cada carta na grade (primeira carta no canto superior esquerdo)
-        for idx, caminho_imagem in enumerate(grupo):
-            col = idx % colunas
-            linha_from_top = idx // colunas  # índice da linha a partir do topo
-            x = margem_x + col * carta_width
-            y = margem_y + grid_height - (linha_from_top + 1) * carta_height
-            print(f"  Inserindo carta {idx+1}: coluna {col+1}, linha {linha_from_top+1} -> x={x:.2f}, y={y:.2f}")
-    
+
+    for num_pagina, grupo in enumerate(folhas, start=1):
+        logger.debug("Processando página %d com %d cartas...", num_pagina, len(grupo))
+
+        # Posiciona cada carta na célula correspondente (a primeira no canto superior esquerdo)
+        for idx, (caminho_imagem, posicao) in enumerate(zip(grupo, layout.posicoes)):
+            logger.debug("  Inserindo carta %d em %r", idx + 1, posicao)
+
             # Se a imagem não estiver no cache, cria um ImageReader
             if caminho_imagem not in image_cache:
+                tracing.contar("pdf.imagens.faltas")
                 try:
-                    image_cache[caminho_imagem] = ImageReader(caminho_imagem)
-                    print(f"    Imagem '{caminho_imagem}' adicionada ao cache.")
+                    with tracing.span("pdf.carregar_imagem", bytes_entrada=os.path.getsize(caminho_imagem)):
+                        image_cache[caminho_imagem] = rl_utils.ImageReader(caminho_imagem)
+                    logger.debug("    Imagem '%s' adicionada ao cache.", caminho_imagem)
                 except Exception as e:
-                    print(f"    Erro ao carregar a imagem '{caminho_imagem}': {e}")
+                    logger.warning("    Erro ao carregar a imagem '%s': %s", caminho_imagem, e)
                     continue
+            else:
+                tracing.contar("pdf.imagens.acertos")
             img_obj = image_cache[caminho_imagem]
-    
+
             # Desenha a imagem mantendo a transparência
-            c.drawImage(
-                img_obj,
-                x,
-                y,
-                width=carta_width,
-                height=carta_height,
-                preserveAspectRatio=True,
-                anchor='c',
-                mask='auto'
-            )
-            print("    Carta desenhada.")
-    
-        # Desenha as linhas de corte (linhas contínuas, cor cinza claro)
-        c.setLineWidth(0.5)
-        c.setStrokeColorRGB(0.8, 0.8, 0.8)
-        print("  Desenhando linhas de corte...")
-    
-        for col in range(0, colunas + 1):
-            x = margem_x + col * carta_width
-            c.line(x, 0, x, pagina_altura)
-            print(f"    Linha vertical {col+1} desenhada em x = {x:.2f}")
-    
-        for linha in range(0, linhas + 1):
-            y = margem_y + linha * carta_height
-            c.line(0, y, pagina_largura, y)
-            print(f"    Linha horizontal {linha+1} desenhada em y = {y:.2f}")
-    
+            # (na primeira vez, o ReportLab embute a imagem no PDF aqui)
+            with tracing.span("pdf.embutir"):
+                _desenhar_carta(c, img_obj, posicao)
+            logger.debug("    Carta desenhada.")
+
+        # Linhas de corte: apenas uma referência ao form definido no início
+        c.doForm(NOME_FORM_CORTE)
+
         c.showPage()
-        print(f"Página {num_paginas} finalizada.")
-    
-    c.save()
-    print(f"\nPDF gerado com sucesso: {pdf_saida}")
-    print(f"Total de páginas geradas: {num_paginas}")
+        logger.debug("Página %d finalizada.", num_pagina)
+
+def _salvar_canvas(c, pdf_saida):
+    with tracing.span("pdf.salvar") as attrs_salvar:
+        c.save()
+        attrs_salvar["bytes_saida"] = os.path.getsize(pdf_saida)
+
+def _mesclar_paginas(pdf_saida, layout, folhas, conteudos, antigas, alteradas):
+    """
+    Monta o novo PDF copiando as páginas inalteradas do PDF existente (com seus streams de
+    imagem, sem decodificá-los) e desenhando apenas as páginas em 'alteradas'.
+    """
+    temporario_novas = pdf_saida + ".novas.tmp"
+    temporario_saida = pdf_saida + ".tmp"
+    try:
+        leitor_novas = None
+        if alteradas:
+            c = _novo_canvas(temporario_novas, layout)
+            _desenhar_paginas(c, layout, [folhas[i] for i in alteradas])
+            _salvar_canvas(c, temporario_novas)
+            leitor_novas = pypdf.PdfReader(temporario_novas)
+        with tracing.span("pdf.mesclar") as attrs_mesclar:
+            leitor_antigo = pypdf.PdfReader(pdf_saida)
+            escritor = pypdf.PdfWriter()
+            posicao_nova = {indice: n for n, indice in enumerate(alteradas)}
+            copiadas = [leitor_antigo.pages[antigas[conteudo]]
+                        for indice, conteudo in enumerate(conteudos) if indice not in posicao_nova]
+            if leitor_novas is not None:
+                try:
+                    _reaproveitar_xobjetos(leitor_novas.pages, copiadas)
+                except AttributeError:
+                    # _chave_stream depende de um atributo privado do pypdf: se ele mudar,
+                    # as imagens repetidas apenas deixam de ser compartilhadas entre páginas
+                    logger.warning("pypdf sem StreamObject._data; imagens das páginas novas não serão reaproveitadas.")
+            for indice, conteudo in enumerate(conteudos):
+                if indice in posicao_nova:
+                    escritor.add_page(leitor_novas.pages[posicao_nova[indice]])
+                else:
+                    escritor.add_page(leitor_antigo.pages[antigas[conteudo]])
+            with open(temporario_saida, "wb") as f:
+                escritor.write(f)
+            attrs_mesclar["bytes_saida"] = os.path.getsize(temporario_saida)
+        os.replace(temporario_saida, pdf_saida)
+    finally:
+        for temporario in (temporario_novas, temporario_saida):
+            if os.path.exists(temporario):
+                os.remove(temporario)
+
+def _chave_stream(objeto):
+    # Os bytes do stream como estão no arquivo: o ReportLab gera streams idênticos para
+    # a mesma imagem, então não é preciso decodificá-los para compará-los.
+    # StreamObject._data é privado (verificado no pypdf 6.20.1); se deixar de existir,
+    # levanta AttributeError e _mesclar_paginas segue sem reaproveitar os XObjects.
+    return (objeto.get("/Width"), objeto.get("/Height"), hashlib.sha1(objeto._data).hexdigest())
+
+def _reaproveitar_xobjetos(paginas_novas, paginas_copiadas):
+    """
+    Faz as páginas novas apontarem para os XObjects que já existem nas páginas copiadas
+    do PDF anterior: o form das linhas de corte (pelo nome) e as imagens e máscaras de
+    transparência idênticas. Como a troca é feita antes de as páginas entrarem no
+    PdfWriter, cada objeto é copiado uma única vez para o novo PDF.
+    """
+    form_corte = "/FormXob." + NOME_FORM_CORTE
+    existentes = {}
+    for pagina in paginas_copiadas:
+        xobjetos = pagina["/Resources"].get("/XObject", {})
+        for nome in xobjetos:
+            if nome == form_corte:
+                existentes.setdefault(nome, xobjetos.raw_get(nome))
+                continue
+            objeto = xobjetos[nome].get_object()
+            existentes.setdefault(_chave_stream(objeto), xobjetos.raw_get(nome))
+            if "/SMask" in objeto:
+                existentes.setdefault(_chave_stream(objeto["/SMask"].get_object()), objeto.raw_get("/SMask"))
+    for pagina in paginas_novas:
+        xobjetos = pagina["/Resources"].get("/XObject", {})
+        for nome in list(xobjetos):
+            if nome == form_corte:
+                existente = existentes.get(nome)
+            else:
+                objeto = xobjetos[nome].get_object()
+                existente = existentes.get(_chave_stream(objeto))
+                # Imagens diferentes podem ter a mesma máscara (ex.: cantos arredondados)
+                if existente is None and "/SMask" in objeto:
+                    mascara = existentes.get(_chave_stream(objeto["/SMask"].get_object()))
+                    if mascara is not None:
+                        objeto[pypdf.generic.NameObject("/SMask")] = mascara
+            if existente is not None:
+                xobjetos[pypdf.generic.NameObject(nome)] = existente
+
+def _criar_pdf(pasta_cartas, pdf_saida, colunas, linhas, largura_carta_mm, altura_carta_mm,
+               papel, gutter_mm, sangria_mm, margem_mm, pasta_tokens, compartilhar_folhas,
+               incremental, attrs):
+    logger.info("Iniciando criação do PDF...")
+
+    layout = imposition.calcular_layout(
+        papel, largura_carta_mm, altura_carta_mm, gutter_mm=gutter_mm, sangria_mm=sangria_mm,
+        margem_mm=margem_mm, colunas=colunas, linhas=linhas
+    )
+    logger.info(f"Tamanho da página: {layout.papel_mm[0]:.1f} x {layout.papel_mm[1]:.1f} mm")
+    logger.info(f"Imposição: {layout.descricao}, {layout.cartas_por_folha} cartas por folha.")
+
+    caminhos_imagens = listar_imagens_expandidas(pasta_cartas)
+    caminhos_tokens = listar_imagens_expandidas(pasta_tokens) if pasta_tokens else []
+    logger.info(f"Total de imagens após expansão: {len(caminhos_imagens)} cartas, {len(caminhos_tokens)} tokens")
 
-def compress_pdf(input_pdf, output_pdf, ghostscript_path="gswin64c.exe", settings="/prepress"):
+    # O conteúdo de cada página é a sequência de hashes das imagens nas suas células;
+    # junto com a assinatura do layout, identifica a página independentemente dos nomes
+    manifesto_antigo = _carregar_manifesto(pdf_saida) if incremental else None
+    arquivos = _hashes_imagens(set(caminhos_imagens + caminhos_tokens),
+                               (manifesto_antigo or {}).get("arquivos", {}))
+    assinatura = {
+        "versao": VERSAO_MANIFESTO,
+        "papel": list(layout.papel_mm),
+        "posicoes": [[round(p.x, 4), round(p.y, 4), round(p.largura, 4), round(p.altura, 4), p.rotacionada]
+                     for p in layout.posicoes],
+        "sangria_mm": layout.sangria_mm,
+    }
+    antigas = _paginas_reaproveitaveis(manifesto_antigo, assinatura, pdf_saida)
+
+    def chave(caminho):
+        return arquivos[caminho]["hash"] if caminho in arquivos else "?" + caminho
+
+    k = layout.cartas_por_folha
+    if antigas:
+        # Com um PDF anterior válido, cada imagem mantém a folha e a célula que já ocupava
+        # e as novas ocupam as células liberadas, em vez de deslocar as folhas seguintes
+        if imposition.compartilha_folhas(len(caminhos_imagens), len(caminhos_tokens), k, compartilhar_folhas):
+            segmentos = [caminhos_imagens + caminhos_tokens]
+        else:
+            segmentos = [caminhos_imagens, caminhos_tokens]
+        folhas = []
+        for segmento in segmentos:
+            folhas += imposition.distribuir_estavel(segmento, [chave(p) for p in segmento],
+                                                    manifesto_antigo["paginas"], k)
+    else:
+        folhas = imposition.distribuir_em_folhas(
+            caminhos_imagens, caminhos_tokens, k, compartilhar=compartilhar_folhas
+        )
+    conteudos = [tuple(chave(p) for p in grupo) for grupo in folhas]
+    alteradas = [i for i, conteudo in enumerate(conteudos) if conteudo not in antigas]
+
+    if antigas and not alteradas and conteudos == [tuple(p) for p in manifesto_antigo["paginas"]]:
+        logger.info(f"Nenhuma página mudou; o PDF existente foi mantido: {pdf_saida}")
+        renderizadas = 0
+    elif antigas and len(alteradas) < len(conteudos) and _pypdf_disponivel():
+        logger.info(f"Reconstrução incremental: {len(conteudos) - len(alteradas)} página(s) reaproveitada(s), "
+                    f"{len(alteradas)} a desenhar.")
+        _mesclar_paginas(pdf_saida, layout, folhas, conteudos, antigas, alteradas)
+        renderizadas = len(alteradas)
+    else:
+        c = _novo_canvas(pdf_saida, layout)
+        logger.info("Canvas criado com compressão habilitada.")
+        _desenhar_paginas(c, layout, folhas)
+        _salvar_canvas(c, pdf_saida)
+        renderizadas = len(folhas)
+    tracing.contar("pdf.paginas.acertos", len(folhas) - renderizadas)
+    tracing.contar("pdf.paginas.faltas", renderizadas)
+
+    _salvar_manifesto(pdf_saida, {
+        "assinatura": assinatura,
+        "paginas": [list(conteudo) for conteudo in conteudos],
+        "arquivos": arquivos,
+        "pdf": _estado_arquivo(pdf_saida),
+    })
+    attrs["paginas"] = len(folhas)
+    attrs["paginas_desenhadas"] = renderizadas
+    attrs["cartas"] = len(caminhos_imagens) + len(caminhos_tokens)
+    attrs["cartas_por_folha"] = layout.cartas_por_folha
+    logger.info(f"PDF gerado com sucesso: {pdf_saida}")
+    logger.info(f"Total de páginas geradas: {len(folhas)}")
+
+def _pypdf_disponivel():
+    try:
+        pypdf._carregar()
+    except ImportError:
+        logger.info("pypdf não está instalado; o PDF será reconstruído por completo.")
+        return False
+    return True
+
+def _parametros_compressao(input_pdf, ghostscript_path, settings):
+    """Descreve uma compressão: o estado do PDF original e as opções do Ghostscript."""
+    return {"entrada": _estado_arquivo(input_pdf), "ghostscript": ghostscript_path, "settings": settings}
+
+def compress_pdf(input_pdf, output_pdf, ghostscript_path="gswin64c.exe", settings="/prepress", forcar=False):
     """
-    Chama o Ghostscript para comprimir o PDF.
+    Chama o Ghostscript para comprimir o PDF. As opções da compressão e o estado do PDF
+    original ficam registrados em "<output_pdf>.compressao.json"; se nada mudou desde a
+    última compressão (ex.: a reconstrução não alterou nenhuma página), ela é pulada.
     
     Parâmetros:
       - input_pdf: Caminho do PDF original.
       - output_pdf: Caminho do PDF comprimido.
       - ghostscript_path: Caminho para o executável do Ghostscript.
       - settings: Parâmetro para -dPDFSETTINGS (ex.: /prepress, /printer, /ebook, /screen).
+      - forcar: Comprime mesmo que o PDF comprimido pareça atualizado.
     """
+    registro = output_pdf + ".compressao.json"
+    parametros = None
+    if os.path.exists(input_pdf):
+        parametros = _parametros_compressao(input_pdf, ghostscript_path, settings)
+        if not forcar and os.path.exists(output_pdf):
+            try:
+                with open(registro, "r", encoding="utf-8") as f:
+                    anterior = json.load(f)
+            except (OSError, ValueError):
+                anterior = None
+            if anterior == parametros:
+                logger.info(f"PDF comprimido já está atualizado: {output_pdf}")
+                return
+
     # Verifica se o Ghostscript está instalado
     if not shutil.which(ghostscript_path):
-        print("Ghostscript não está instalado ou não está no PATH. Pule a compressão.")
+        logger.warning("Ghostscript não está instalado ou não está no PATH. Pule a compressão.")
         return
 
     cmd = [
@@ -184,13 +471,21 @@ def compress_pdf(input_pdf, output_pdf, ghostscript_path="gswin64c.exe", setting
         input_pdf
     ]
     try:
-        print("Iniciando compressão do PDF via Ghostscript...")
-        subprocess.run(cmd, check=True)
-        print(f"PDF comprimido com sucesso: {output_pdf}")
+        logger.info("Iniciando compressão do PDF via Ghostscript...")
+        if os.path.exists(registro):
+            os.remove(registro)
+        bytes_entrada = os.path.getsize(input_pdf) if parametros else 0
+        with tracing.etapa("ghostscript", bytes_entrada=bytes_entrada) as attrs:
+            subprocess.run(cmd, check=True)
+            attrs["bytes_saida"] = os.path.getsize(output_pdf)
+        with open(registro, "w", encoding="utf-8") as f:
+            json.dump(parametros, f)
+        logger.info(f"PDF comprimido com sucesso: {output_pdf}")
     except subprocess.CalledProcessError as e:
-        print(f"Erro na compressão do PDF: {e}")
+        logger.error(f"Erro na compressão do PDF: {e}")
 
 if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
     # Pasta onde estão as cartas processadas (imagens com fundo original/transparente)
     pasta_cartas = "cartas"
     # Nome do PDF de saída (antes da compressão)
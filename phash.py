@@ -0,0 +1,188 @@
+import os
+import json
+import threading
+from io import BytesIO
+from concurrent.futures import ThreadPoolExecutor
+
+from lazy_import import importar_sob_demanda
+from image_store import chave_da_url
+
+np = importar_sob_demanda("numpy")
+requests = importar_sob_demanda("requests")
+Image = importar_sob_demanda("PIL.Image")
+
+# Arquivo onde os hashes perceptuais já calculados ficam guardados entre sessões
+PHASH_CACHE = os.path.join(".cache", "phash.json")
+
+# Distância de Hamming máxima (em bits, de 64) para considerar duas artes idênticas
+LIMIAR_PADRAO = 6
+
+# Tamanho reduzido usado pelo dHash: 9x8 gera 8x8 = 64 comparações entre vizinhos
+_LARGURA_HASH, _ALTURA_HASH = 9, 8
+
+def reduzir_para_hash(img):
+    """Converte a imagem para tons de cinza 9x8, a única etapa feita por imagem."""
+    # Para JPEG, decodifica já em escala reduzida (bem mais rápido que a imagem inteira)
+    img.draft("L", (_LARGURA_HASH * 4, _ALTURA_HASH * 4))
+    img = img.convert("L")
+    return np.asarray(img.resize((_LARGURA_HASH, _ALTURA_HASH), Image.BILINEAR), dtype=np.int16)
+
+def dhash_lote(imagens):
+    """
+    Calcula o dHash (hash de diferenças, 64 bits) de uma lista de imagens PIL.
+    As imagens são reduzidas individualmente e a comparação entre pixels vizinhos
+    e o empacotamento dos bits são feitos de uma vez só sobre o lote inteiro.
+    Retorna um array numpy uint64 com um hash por imagem.
+    """
+    if not imagens:
+        return np.zeros(0, dtype=np.uint64)
+    lote = np.stack([reduzir_para_hash(img) for img in imagens])
+    bits = lote[:, :, 1:] > lote[:, :, :-1]
+    empacotado = np.packbits(bits.reshape(len(imagens), -1), axis=1)
+    return empacotado.view(">u8").ravel().astype(np.uint64)
+
+def distancias_hamming(hashes):
+    """Retorna a matriz NxN de distâncias de Hamming entre os hashes (uint64)."""
+    hashes = np.asarray(hashes, dtype=np.uint64)
+    xor = hashes[:, None] ^ hashes[None, :]
+    return np.unpackbits(xor.view(np.uint8).reshape(len(hashes), len(hashes), 8), axis=2).sum(axis=2)
+
+class PerceptualHashCache:
+    """
+    Cache persistente de hashes perceptuais, indexado pela chave da imagem
+    (a mesma usada pelo ImageStore). Cada imagem é baixada e reduzida uma única vez.
+    """
+    def __init__(self, caminho=PHASH_CACHE):
+        self.caminho = caminho
+        self._lock = threading.Lock()
+        self._dados = None
+
+    @property
+    def _hashes(self):
+        # O arquivo só é lido no primeiro uso, não na criação da interface
+        if self._dados is None:
+            try:
+                with open(self.caminho, "r", encoding="utf-8") as f:
+                    self._dados = json.load(f)
+            except (OSError, ValueError):
+                self._dados = {}
+        return self._dados
+
+    def obter(self, chave):
+        valor = self._hashes.get(chave)
+        return int(valor, 16) if valor is not None else None
+
+    def salvar(self):
+        with self._lock:
+            pasta = os.path.dirname(self.caminho)
+            if pasta:
+                os.makedirs(pasta, exist_ok=True)
+            temporario = self.caminho + ".tmp"
+            with open(temporario, "w", encoding="utf-8") as f:
+                json.dump(self._hashes, f)
+            os.replace(temporario, self.caminho)
+
+    def calcular(self, urls, num_workers=8):
+        """
+        Retorna um dicionário url -> hash para as URLs indicadas. Apenas as imagens
+        ainda não presentes no cache são baixadas (em paralelo) e hasheadas em lote.
+        """
+        resultado = {}
+        faltando = []
+        for url in urls:
+            valor = self.obter(chave_da_url(url))
+            if valor is None:
+                faltando.append(url)
+            else:
+                resultado[url] = valor
+        if not faltando:
+            return resultado
+
+        def abrir(url):
+            try:
+                response = requests.get(url, timeout=30)
+                if response.status_code == 200:
+                    return url, Image.open(BytesIO(response.content))
+            except Exception:
+                pass
+            return url, None
+
+        with ThreadPoolExecutor(max_workers=num_workers) as executor:
+            baixadas = [(url, img) for url, img in executor.map(abrir, faltando) if img is not None]
+        hashes = dhash_lote([img for _, img in baixadas])
+        with self._lock:
+            for (url, _), valor in zip(baixadas, hashes):
+                self._hashes[chave_da_url(url)] = f"{int(valor):016x}"
+                resultado[url] = int(valor)
+        self.salvar()
+        return resultado
+
+def url_para_hash(card):
+    """
+    Retorna a URL usada no hash perceptual: o recorte da ilustração ('art_crop'), para que
+    moldura, título e caixa de texto (iguais entre artes diferentes da mesma moldura) não
+    pesem na comparação; sem ele, a menor imagem da carta.
+    """
+    if "card_faces" in card and card["card_faces"] and "image_uris" not in card:
+        uris = card["card_faces"][0].get("image_uris", {})
+    else:
+        uris = card.get("image_uris", {})
+    return uris.get("art_crop") or uris.get("small") or uris.get("normal") or uris.get("png")
+
+def agrupar_por_arte(cards, cache=None, limiar=LIMIAR_PADRAO):
+    """
+    Agrupa prints com arte visualmente idêntica. Retorna uma lista de grupos
+    (listas de cards), preservando a ordem original do primeiro card de cada grupo.
+
+    Prints com o mesmo 'illustration_id' do Scryfall são agrupados sem baixar nada.
+    O 'illustration_id' é autoritativo: dois grupos com ids diferentes nunca são unidos.
+    O hash perceptual (dHash da ilustração) só é usado para encaixar os prints sem
+    'illustration_id' em um grupo, e só é calculado quando algum print não tem o id.
+    """
+    cache = cache if cache is not None else PerceptualHashCache()
+    grupos = []
+    ids = []  # illustration_id de cada grupo (None se o print não tem)
+    por_ilustracao = {}
+    for card in cards:
+        ilustracao = card.get("illustration_id") or (card.get("card_faces") or [{}])[0].get("illustration_id")
+        if ilustracao and ilustracao in por_ilustracao:
+            por_ilustracao[ilustracao].append(card)
+            continue
+        grupo = [card]
+        grupos.append(grupo)
+        ids.append(ilustracao or None)
+        if ilustracao:
+            por_ilustracao[ilustracao] = grupo
+
+    if all(ids):
+        return grupos
+
+    urls = [url_para_hash(grupo[0]) for grupo in grupos]
+    hashes = cache.calcular([url for url in urls if url])
+    indices = [i for i, url in enumerate(urls) if url in hashes]
+    if len(indices) < 2:
+        return grupos
+
+    distancias = distancias_hamming([hashes[urls[i]] for i in indices])
+    destino = list(range(len(grupos)))
+    for a in range(len(indices)):
+        if destino[indices[a]] != indices[a]:
+            continue
+        ra = indices[a]
+        for b in np.nonzero(distancias[a, a + 1:] <= limiar)[0] + a + 1:
+            rb = indices[b]
+            if destino[rb] != rb:
+                continue
+            # Nunca une dois grupos com illustration_id diferentes (nem por transitividade)
+            if ids[ra] and ids[rb] and ids[ra] != ids[rb]:
+                continue
+            destino[rb] = ra
+            ids[ra] = ids[ra] or ids[rb]
+
+    unidos = []
+    for i, grupo in enumerate(grupos):
+        if destino[i] == i:
+            unidos.append(grupo)
+        else:
+            grupos[destino[i]].extend(grupo)
+    return unidos
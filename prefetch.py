@@ -0,0 +1,183 @@
+import os
+import time
+import queue
+import threading
+
+from lazy_import import importar_sob_demanda
+from image_store import ImageStore, chave_da_url, extensao_da_url
+import tracing
+
+requests = importar_sob_demanda("requests")
+
+class _Tarefa:
+    def __init__(self, url):
+        self.url = url
+        self.cancelado = threading.Event()
+        self.concluido = threading.Event()
+        self.iniciada = False     # o worker já começou a baixar
+        self.sem_limite = False   # o usuário está esperando: ignora o limite de banda
+        self.caminho = None
+
+class Prefetcher:
+    """
+    Baixa em segundo plano as imagens em resolução máxima que provavelmente serão
+    escolhidas (a edição padrão de cada carta), enquanto o usuário revisa a lista.
+
+    As imagens são gravadas no armazenamento local compartilhado (ImageStore), de onde
+    o passo de download cria as vistas em 'imagens/'.
+
+    O download usa poucas threads daemon e respeita um limite de banda
+    (bytes_por_segundo), para não competir com as buscas e thumbnails da interface.
+    Cada carta é identificada por uma chave: agendar uma URL nova para a mesma
+    chave cancela o pré-download anterior.
+
+    Parâmetros:
+      - store: Armazenamento de imagens onde os arquivos pré-baixados são salvos.
+      - bytes_por_segundo: Limite de banda total (None para ilimitado).
+      - num_workers: Número de threads de download (padrão 1).
+    """
+    def __init__(self, store=None, bytes_por_segundo=512 * 1024, num_workers=1):
+        self.store = store if store is not None else ImageStore()
+        self.bytes_por_segundo = bytes_por_segundo
+        self._fila = queue.Queue()
+        self._lock = threading.Lock()
+        self._tarefas = {}  # url -> _Tarefa (apenas as pendentes e em andamento)
+        self._chaves = {}   # chave -> url
+        self._bytes_janela = 0
+        self._inicio_janela = time.monotonic()
+        self._workers = []
+        for _ in range(num_workers):
+            t = threading.Thread(target=self._worker, daemon=True)
+            t.start()
+            self._workers.append(t)
+
+    def agendar(self, chave, url):
+        """Agenda o pré-download de 'url' para a carta 'chave', cancelando a escolha anterior."""
+        with self._lock:
+            anterior = self._chaves.get(chave)
+            if anterior == url:
+                return
+            self._chaves[chave] = url
+            if anterior:
+                self._cancelar_se_orfa(anterior)
+            tarefa = self._tarefas.get(url)
+            if tarefa and not tarefa.cancelado.is_set():
+                return
+            tarefa = _Tarefa(url)
+            self._tarefas[url] = tarefa
+        self._fila.put(tarefa)
+        tracing.medir("prefetch.fila", self._fila.qsize())
+
+    def cancelar(self, chave):
+        """Cancela o pré-download associado à carta 'chave'."""
+        with self._lock:
+            url = self._chaves.pop(chave, None)
+            if url:
+                self._cancelar_se_orfa(url)
+
+    def obter(self, url, timeout=None):
+        """
+        Retorna o caminho local da imagem se ela já foi pré-baixada.
+
+        Chamado quando o usuário precisa da imagem agora: se o pré-download ainda está na
+        fila, ele é cancelado e None é retornado, para que o chamador baixe a imagem
+        diretamente, sem limite de banda. Se já está em andamento, o limite de banda é
+        removido para essa tarefa e a chamada aguarda até 'timeout' segundos.
+        Retorna None se a URL não foi agendada, se o pré-download falhou ou se o tempo
+        esgotou.
+        """
+        caminho = self.store.caminho(chave_da_url(url))
+        if caminho:
+            return caminho
+        with self._lock:
+            tarefa = self._tarefas.get(url)
+            if tarefa is None or tarefa.cancelado.is_set():
+                return None
+            if not tarefa.iniciada:
+                self._cancelar_tarefa(tarefa)
+                return None
+            tarefa.sem_limite = True
+        tarefa.concluido.wait(timeout)
+        return tarefa.caminho
+
+    def _cancelar_se_orfa(self, url):
+        # Só cancela se nenhuma outra carta ainda depende desta URL
+        if url in self._chaves.values():
+            return
+        tarefa = self._tarefas.get(url)
+        if tarefa and not tarefa.concluido.is_set():
+            self._cancelar_tarefa(tarefa)
+
+    def _cancelar_tarefa(self, tarefa):
+        # Chamado com o lock. Uma tarefa que ainda não começou sai do registro na hora
+        # (o worker a descarta ao tirá-la da fila); uma em andamento sai ao terminar.
+        tarefa.cancelado.set()
+        if not tarefa.iniciada:
+            self._descartar(tarefa)
+
+    def _descartar(self, tarefa):
+        # Remove a tarefa do registro, a menos que a URL já tenha sido reagendada
+        if self._tarefas.get(tarefa.url) is tarefa:
+            del self._tarefas[tarefa.url]
+
+    def _aguardar_banda(self, tarefa, n_bytes):
+        # Limitação simples de banda: dorme o necessário para manter a taxa média
+        if not self.bytes_por_segundo or tarefa.sem_limite:
+            return
+        with self._lock:
+            agora = time.monotonic()
+            if agora - self._inicio_janela > 1.0:
+                self._inicio_janela = agora
+                self._bytes_janela = 0
+            self._bytes_janela += n_bytes
+            esperado = self._bytes_janela / self.bytes_por_segundo
+            atraso = esperado - (agora - self._inicio_janela)
+        if atraso > 0:
+            time.sleep(atraso)
+
+    def _worker(self):
+        while True:
+            tarefa = self._fila.get()
+            tracing.medir("prefetch.fila", self._fila.qsize())
+            with self._lock:
+                iniciar = not tarefa.cancelado.is_set()
+                tarefa.iniciada = iniciar
+            try:
+                if iniciar:
+                    with tracing.etapa("prefetch.download", url=tarefa.url) as attrs:
+                        tarefa.caminho = self._baixar(tarefa)
+                        attrs["bytes_entrada"] = os.path.getsize(tarefa.caminho) if tarefa.caminho else 0
+            finally:
+                tarefa.concluido.set()
+                # Concluída ou cancelada, a tarefa não é mais necessária: uma imagem
+                # baixada é encontrada pelo store em obter()
+                with self._lock:
+                    self._descartar(tarefa)
+                self._fila.task_done()
+
+    def _baixar(self, tarefa):
+        chave = chave_da_url(tarefa.url)
+        caminho = self.store.caminho(chave)
+        if caminho:
+            return caminho
+        os.makedirs(self.store.raiz, exist_ok=True)
+        temporario = os.path.join(self.store.raiz, f"{chave}.{threading.get_ident()}.part")
+        try:
+            response = requests.get(tarefa.url, stream=True, timeout=30)
+            if response.status_code != 200:
+                return None
+            with open(temporario, "wb") as f:
+                for chunk in response.iter_content(16 * 1024):
+                    if tarefa.cancelado.is_set():
+                        break
+                    f.write(chunk)
+                    self._aguardar_banda(tarefa, len(chunk))
+            response.close()
+            if tarefa.cancelado.is_set():
+                os.remove(temporario)
+                return None
+            return self.store.adicionar(chave, temporario, extensao_da_url(tarefa.url), mover=True)
+        except Exception:
+            if os.path.exists(temporario):
+                os.remove(temporario)
+            return None
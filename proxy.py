@@ -1,6 +1,19 @@
 import os
-from PIL import Image
-from concurrent.futures import ProcessPoolExecutor, as_completed
+import json
+import time
+import logging
+import contextlib
+from image_store import hash_arquivo
+from lazy_import import importar_sob_demanda
+
+import tracing
+
+# Dependências pesadas, importadas só quando a conversão é usada
+np = importar_sob_demanda("numpy")
+Image = importar_sob_demanda("PIL.Image")
+futures = importar_sob_demanda("concurrent.futures")
+
+logger = logging.getLogger(__name__)
 
 def redimensionar_manter_proporcao(img, largura_alvo, altura_alvo):
     """
@@ -26,11 +39,62 @@ def redimensionar_manter_proporcao(img, largura_alvo, altura_alvo):
     img_cortada = img_redim.crop((esquerda, topo, direita, fundo))
     return img_cortada
 
-def process_image(caminho_arquivo, pasta_saida, largura_px, altura_px, dpi):
+def detectar_cor_borda(lote):
+    """
+    Detecta a cor da borda de um lote de cartas (array N x H x W x 4, uint8).
+    Amostra faixas finas no meio das quatro bordas, longe dos cantos arredondados,
+    e retorna a mediana por canal de cada imagem (array N x 3).
+    """
+    n, altura, largura = lote.shape[:3]
+    faixa = max(2, altura // 100)
+    mx, my = largura // 10, altura // 10
+    amostras = np.concatenate([
+        lote[:, :faixa, mx:-mx, :3].reshape(n, -1, 3),
+        lote[:, -faixa:, mx:-mx, :3].reshape(n, -1, 3),
+        lote[:, my:-my, :faixa, :3].reshape(n, -1, 3),
+        lote[:, my:-my, -faixa:, :3].reshape(n, -1, 3),
+    ], axis=1)
+    return np.median(amostras, axis=1)
+
+def preparar_lote_para_impressao(lote, sangria_px=0):
+    """
+    Prepara um lote de cartas do mesmo tamanho (array N x H x W x 4, uint8) para impressão:
+      - Preenche os cantos transparentes com a cor da borda de cada carta (composição
+        alfa contra a cor detectada), eliminando os entalhes brancos nas linhas de corte.
+      - Opcionalmente adiciona sangria, estendendo a borda 'sangria_px' pixels para fora.
+    As operações são vetorizadas sobre os pixels de cada imagem. A conversão chama esta
+    função com uma imagem por vez (N = 1): cada worker já processa uma carta, e um lote de
+    cartas a 600 dpi multiplicaria a memória dos intermediários em float32 por worker.
+    Retorna um array N x (H + 2*sangria) x (W + 2*sangria) x 3, uint8.
+    """
+    cores = detectar_cor_borda(lote).astype(np.float32)[:, None, None, :]
+    alfa = lote[..., 3:4].astype(np.float32) / 255.0
+    rgb = lote[..., :3].astype(np.float32) * alfa + cores * (1.0 - alfa)
+    rgb = np.rint(rgb).astype(np.uint8)
+    if sangria_px > 0:
+        rgb = np.pad(rgb, ((0, 0), (sangria_px, sangria_px), (sangria_px, sangria_px), (0, 0)), mode="edge")
+    return rgb
+
+def preparar_para_impressao(img, sangria_px=0):
+    """Aplica preparar_lote_para_impressao a uma única imagem PIL (usada pela conversão)."""
+    lote = np.asarray(img.convert("RGBA"))[None]
+    return Image.fromarray(preparar_lote_para_impressao(lote, sangria_px)[0], "RGB")
+
+def mm_para_px(medida_mm, dpi):
+    return int(round(medida_mm / 25.4 * dpi))
+
+def process_image(caminho_arquivo, pasta_saida, largura_px, altura_px, dpi, preencher_cantos=True, sangria_px=0, tempos=None):
     """
     Processa uma única imagem: abre, converte para RGBA (se necessário), redimensiona,
     realiza o crop central e salva como PNG com otimização.
+    Se 'preencher_cantos' for True, os cantos transparentes são preenchidos com a cor
+    da borda e 'sangria_px' pixels de sangria são adicionados em cada lado.
+    Se 'tempos' for uma lista, recebe (sub-etapa, início, fim) de cada passo.
     """
+    def marcar(nome, inicio):
+        if tempos is not None:
+            tempos.append((nome, inicio, time.time()))
+
     nome_arquivo = os.path.basename(caminho_arquivo)
     nome_saida = os.path.splitext(nome_arquivo)[0] + '.png'
     caminho_saida = os.path.join(pasta_saida, nome_saida)
@@ -41,15 +105,71 @@ def process_image(caminho_arquivo, pasta_saida, largura_px, altura_px, dpi):
     
     try:
         with Image.open(caminho_arquivo) as img:
+            t = time.time()
+            img.load()
             if img.mode != 'RGBA':
                 img = img.convert('RGBA')
+            marcar("conversao.decodificacao", t)
+            t = time.time()
             img_final = redimensionar_manter_proporcao(img, largura_px, altura_px)
+            marcar("conversao.redimensionamento", t)
+            if preencher_cantos:
+                t = time.time()
+                img_final = preparar_para_impressao(img_final, sangria_px)
+                marcar("conversao.preparo", t)
+            t = time.time()
             img_final.save(caminho_saida, format="PNG", dpi=(dpi, dpi), optimize=True, compress_level=9)
+            marcar("conversao.codificacao_png", t)
         return f"Salvou otimizada para impressão: {caminho_saida}"
     except Exception as e:
         return f"Erro ao processar '{caminho_arquivo}': {e}"
 
-def converter_para_63x88_mm(pasta_entrada: str, pasta_saida: str, dpi: int = 600, num_workers: int = None):
+def _process_image_medido(selecao_perfil, caminho_arquivo, pasta_saida, *args):
+    """
+    Executa process_image em um worker e devolve, junto com o resultado, se a saída foi
+    gerada, as medições (tempos das sub-etapas, bytes de entrada/saída e pid) e o perfil
+    do worker (ver tracing.perfilar_worker) para o processo principal.
+    """
+    tempos = []
+    with tracing.perfilar_worker(selecao_perfil) as perfil:
+        inicio = time.time()
+        resultado = process_image(caminho_arquivo, pasta_saida, *args, tempos=tempos)
+        fim = time.time()
+    caminho_saida = os.path.join(pasta_saida, os.path.splitext(os.path.basename(caminho_arquivo))[0] + '.png')
+    bytes_entrada = os.path.getsize(caminho_arquivo) if os.path.exists(caminho_arquivo) else 0
+    sucesso = os.path.exists(caminho_saida)
+    bytes_saida = os.path.getsize(caminho_saida) if sucesso else 0
+    return resultado, sucesso, inicio, fim, os.getpid(), tempos, bytes_entrada, bytes_saida, perfil
+
+def chave_convertida(caminho_arquivo, largura_px, altura_px, dpi, preencher_cantos=True, sangria_px=0):
+    """
+    Retorna a chave, no armazenamento de imagens, da versão convertida de um arquivo:
+    hash do conteúdo original mais os parâmetros de conversão.
+    """
+    chave = f"{hash_arquivo(caminho_arquivo)}-{largura_px}x{altura_px}-{dpi}dpi"
+    if preencher_cantos:
+        chave += f"-prep{sangria_px}"
+    return chave
+
+# Registro, dentro da pasta de saída, da chave (ver chave_convertida) de cada imagem convertida
+NOME_REGISTRO_CONVERSOES = ".conversoes.json"
+
+def _carregar_registro(pasta_saida):
+    try:
+        with open(os.path.join(pasta_saida, NOME_REGISTRO_CONVERSOES), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def _salvar_registro(pasta_saida, registro):
+    caminho = os.path.join(pasta_saida, NOME_REGISTRO_CONVERSOES)
+    temporario = caminho + ".tmp"
+    with open(temporario, "w", encoding="utf-8") as f:
+        json.dump(registro, f)
+    os.replace(temporario, caminho)
+
+def converter_para_63x88_mm(pasta_entrada: str, pasta_saida: str, dpi: int = 600, num_workers: int = None, store=None,
+                            preencher_cantos: bool = True, sangria_mm: float = 0):
     """
     Redimensiona todas as imagens de 'pasta_entrada' para 63x88 mm na resolução especificada (dpi)
     e salva em 'pasta_saida' usando multiprocessing para acelerar o processamento.
@@ -59,11 +179,26 @@ def converter_para_63x88_mm(pasta_entrada: str, pasta_saida: str, dpi: int = 600
       - pasta_saida: Pasta onde as imagens processadas serão salvas.
       - dpi: Resolução para impressão (ex.: 600).
       - num_workers: Número de processos simultâneos (padrão é None, que usa o máximo disponível).
+      - store: ImageStore opcional. Se informado, conversões já feitas em jobs anteriores
+        são reaproveitadas do armazenamento e as novas são guardadas nele.
+    Imagens já presentes em 'pasta_saida' só são mantidas se foram geradas a partir do mesmo
+    original e com os mesmos parâmetros (registrados em NOME_REGISTRO_CONVERSOES); as
+    demais são refeitas.
+      - preencher_cantos: Preenche os cantos transparentes com a cor da borda (padrão True).
+      - sangria_mm: Sangria adicionada em cada lado, estendendo a borda (padrão 0 mm).
+        A imagem final passa a ter (63 + 2*sangria) x (88 + 2*sangria) mm.
     """
     # Converte 63x88 mm para pixels (usando dpi)
     largura_px = int((63 / 25.4) * dpi)
     altura_px  = int((88 / 25.4) * dpi)
+    sangria_px = mm_para_px(sangria_mm, dpi) if preencher_cantos else 0
+
+    with tracing.etapa("conversao", dpi=dpi) as attrs:
+        _converter(pasta_entrada, pasta_saida, dpi, num_workers, store, preencher_cantos,
+                   largura_px, altura_px, sangria_px, attrs)
 
+def _converter(pasta_entrada, pasta_saida, dpi, num_workers, store, preencher_cantos,
+               largura_px, altura_px, sangria_px, attrs):
     # Cria a pasta de entrada, se não existir   
     if not os.path.exists(pasta_entrada):
         os.makedirs(pasta_entrada)
@@ -77,21 +212,87 @@ def converter_para_63x88_mm(pasta_entrada: str, pasta_saida: str, dpi: int = 600
     arquivos = [os.path.join(pasta_entrada, f) for f in os.listdir(pasta_entrada)
                 if f.lower().endswith(extensoes)]
     
-    print(f"Iniciando o processamento de {len(arquivos)} imagens...")
+    # Mantém as saídas geradas com os mesmos parâmetros e reaproveita do armazenamento as
+    # conversões feitas em jobs anteriores; saídas com outros parâmetros (ex.: outra
+    # sangria) são removidas para serem refeitas
+    registro = _carregar_registro(pasta_saida)
+    chaves = {}
+    pendentes = []
+    with store.lote() if store is not None else contextlib.nullcontext():
+        for caminho in arquivos:
+            chave = chave_convertida(caminho, largura_px, altura_px, dpi, preencher_cantos, sangria_px)
+            nome_saida = os.path.splitext(os.path.basename(caminho))[0] + '.png'
+            caminho_saida = os.path.join(pasta_saida, nome_saida)
+            if os.path.exists(caminho_saida) and registro.get(nome_saida) == chave:
+                tracing.contar("conversao.acertos")
+                continue
+            registro.pop(nome_saida, None)
+            if store is not None and store.vincular(chave, caminho_saida):
+                logger.debug("Reaproveitada do armazenamento: %s", caminho_saida)
+                registro[nome_saida] = chave
+                tracing.contar("conversao.acertos")
+                continue
+            if os.path.lexists(caminho_saida):
+                logger.debug("Parâmetros de conversão mudaram; refazendo: %s", caminho_saida)
+                os.remove(caminho_saida)
+            tracing.contar("conversao.faltas")
+            chaves[caminho_saida] = chave
+            pendentes.append(caminho)
+    arquivos = pendentes
+
+    logger.info("Iniciando o processamento de %d imagens...", len(arquivos))
 
     # Processa as imagens em paralelo utilizando ProcessPoolExecutor
-    with ProcessPoolExecutor(max_workers=num_workers) as executor:
-        futures = [
-            executor.submit(process_image, caminho, pasta_saida, largura_px, altura_px, dpi)
+    inicio = time.time()
+    ocupado = 0.0
+    n_workers = num_workers or os.cpu_count() or 1
+    # O redimensionamento e a codificação rodam nos workers: eles se perfilam e devolvem os dados
+    selecao_perfil = tracing.selecao_perfil("conversao")
+    with futures.ProcessPoolExecutor(max_workers=num_workers) as executor:
+        tarefas = [
+            executor.submit(_process_image_medido, selecao_perfil, caminho, pasta_saida,
+                            largura_px, altura_px, dpi, preencher_cantos, sangria_px)
             for caminho in arquivos
         ]
+        pendentes = len(tarefas)
+        tracing.medir("conversao.fila", pendentes)
         
-        # À medida que cada processamento termina, imprime o resultado
-        for future in as_completed(futures):
-            resultado = future.result()
-            print(resultado)
+        # À medida que cada processamento termina, registra o resultado e as medições
+        for future in futures.as_completed(tarefas):
+            resultado, sucesso, t_inicio, t_fim, pid, tempos, bytes_entrada, bytes_saida, perfil = future.result()
+            tracing.mesclar_perfil("conversao", perfil)
+            if sucesso:
+                logger.debug(resultado)
+            else:
+                logger.warning(resultado)
+                tracing.contar("conversao.erros")
+            tracing.registrar_span("conversao.imagem", t_inicio, t_fim, pid=pid, tid=pid,
+                                   bytes_entrada=bytes_entrada, bytes_saida=bytes_saida)
+            for nome, sub_inicio, sub_fim in tempos:
+                tracing.registrar_span(nome, sub_inicio, sub_fim, pid=pid, tid=pid)
+            ocupado += t_fim - t_inicio
+            pendentes -= 1
+            tracing.medir("conversao.fila", pendentes)
+
+    # Utilização dos workers: tempo ocupado / (tempo total x número de workers)
+    duracao = time.time() - inicio
+    if arquivos and duracao > 0:
+        tracing.medir("conversao.utilizacao_workers", ocupado / (duracao * n_workers))
+    attrs["imagens"] = len(arquivos)
+
+    # Registra as novas conversões e as guarda no armazenamento, substituindo-as por vistas
+    convertidas = {caminho_saida: chave for caminho_saida, chave in chaves.items() if os.path.exists(caminho_saida)}
+    for caminho_saida, chave in convertidas.items():
+        registro[os.path.basename(caminho_saida)] = chave
+    _salvar_registro(pasta_saida, registro)
+    if store is not None and convertidas:
+        with store.lote():
+            for caminho_saida, chave in convertidas.items():
+                store.adicionar(chave, caminho_saida, derivada=True)
+                store.vincular(chave, caminho_saida)
 
 if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
     pasta_entrada = "imagens"   # Pasta com as imagens originais
     pasta_saida   = "cartas"     # Pasta onde as imagens processadas serão salvas
     converter_para_63x88_mm(pasta_entrada, pasta_saida, dpi=600)
@@ -0,0 +1,318 @@
+import os
+import io
+import json
+import time
+import logging
+import itertools
+import threading
+import contextlib
+
+from lazy_import import importar_sob_demanda
+
+# Os perfiladores só são importados quando alguma etapa é perfilada
+pstats = importar_sob_demanda("pstats")
+cProfile = importar_sob_demanda("cProfile")
+tracemalloc = importar_sob_demanda("tracemalloc")
+
+logger = logging.getLogger(__name__)
+
+# Etapas a perfilar, separadas por vírgula ("all" para todas). Ex.: PROXY_PERFIL=conversao,pdf
+# Etapas: conversao, pdf, ghostscript, api (api.named, api.search), thumbnail, download, prefetch.download
+PERFIL_CPROFILE = set(filter(None, os.environ.get("PROXY_PERFIL", "").split(",")))
+PERFIL_TRACEMALLOC = set(filter(None, os.environ.get("PROXY_TRACEMALLOC", "").split(",")))
+PASTA_PERFIS = os.environ.get("PROXY_PERFIL_DIR", "perfis")
+
+_lock = threading.Lock()
+_spans = []
+_contadores = {}
+_medidores = {}
+_perfis_workers = {}
+_sequencia_perfis = itertools.count()
+
+def limpar():
+    """Descarta todos os spans e métricas coletados até agora."""
+    with _lock:
+        _spans.clear()
+        _contadores.clear()
+        _medidores.clear()
+
+def registrar_span(nome, inicio, fim, pid=None, tid=None, **atributos):
+    """
+    Registra um span já medido (ex.: por um processo worker). 'inicio' e 'fim' são
+    timestamps de time.time(), comparáveis entre processos da mesma máquina.
+    """
+    with _lock:
+        _spans.append({
+            "nome": nome,
+            "inicio": inicio,
+            "duracao": fim - inicio,
+            "pid": pid if pid is not None else os.getpid(),
+            "tid": tid if tid is not None else threading.get_ident(),
+            "atributos": atributos,
+        })
+
+@contextlib.contextmanager
+def span(nome, **atributos):
+    """
+    Mede a duração de um bloco. O dicionário retornado pode receber atributos durante
+    a execução (ex.: bytes_entrada, bytes_saida), que são gravados junto com o span.
+    """
+    inicio = time.time()
+    try:
+        yield atributos
+    finally:
+        registrar_span(nome, inicio, time.time(), **atributos)
+
+def contar(nome, valor=1):
+    """Incrementa um contador (ex.: acertos/faltas de cache, bytes baixados)."""
+    with _lock:
+        _contadores[nome] = _contadores.get(nome, 0) + valor
+
+def medir(nome, valor):
+    """Registra o valor atual de um medidor (ex.: profundidade da fila), guardando também o máximo."""
+    with _lock:
+        atual = _medidores.setdefault(nome, {"atual": valor, "maximo": valor})
+        atual["atual"] = valor
+        atual["maximo"] = max(atual["maximo"], valor)
+
+def configurar_perfil(cprofile=None, tracemalloc_etapas=None, pasta=None):
+    """Define programaticamente quais etapas são perfiladas (equivalente às variáveis de ambiente)."""
+    global PASTA_PERFIS
+    if cprofile is not None:
+        PERFIL_CPROFILE.clear()
+        PERFIL_CPROFILE.update(cprofile)
+    if tracemalloc_etapas is not None:
+        PERFIL_TRACEMALLOC.clear()
+        PERFIL_TRACEMALLOC.update(tracemalloc_etapas)
+    if pasta is not None:
+        PASTA_PERFIS = pasta
+
+def _selecionada(nome, etapas):
+    # "api" seleciona também as sub-etapas "api.named" e "api.search"
+    return nome in etapas or nome.split(".")[0] in etapas or "all" in etapas
+
+def _arquivo_perfil(nome, extensao):
+    # Etapas chamadas muitas vezes (downloads, páginas da API) geram vários relatórios
+    # no mesmo segundo: pid e sequência evitam que um sobrescreva o outro
+    os.makedirs(PASTA_PERFIS, exist_ok=True)
+    sufixo = f"{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}-{next(_sequencia_perfis)}"
+    return os.path.join(PASTA_PERFIS, f"{nome}-{sufixo}{extensao}")
+
+def _iniciar_cprofile():
+    perfil = cProfile.Profile()
+    try:
+        perfil.enable()
+    except ValueError:
+        # Outra etapa já está sob cProfile (ex.: downloads simultâneos em threads)
+        logger.debug("cProfile já ativo; etapa não perfilada")
+        return None
+    return perfil
+
+class _StatsWorker:
+    """Adapta os dados de pstats enviados por um worker para pstats.Stats.add."""
+    def __init__(self, stats):
+        self.stats = stats
+
+    def create_stats(self):
+        pass
+
+def selecao_perfil(nome):
+    """
+    Retorna (cprofile, tracemalloc) indicando como a etapa 'nome' é perfilada, para
+    repassar a processos workers (que não herdam configurar_perfil).
+    """
+    return _selecionada(nome, PERFIL_CPROFILE), _selecionada(nome, PERFIL_TRACEMALLOC)
+
+@contextlib.contextmanager
+def perfilar_worker(selecao):
+    """
+    Perfila um bloco executado em um processo worker, conforme selecao_perfil. O dicionário
+    retornado recebe 'stats' (dados do pstats) e 'pico_memoria' (bytes), que o processo
+    principal soma ao relatório da etapa com mesclar_perfil.
+    """
+    usar_cprofile, usar_tracemalloc = selecao
+    dados = {}
+    perfil = _iniciar_cprofile() if usar_cprofile else None
+    # Workers criados por fork herdam o tracemalloc já ativo do processo principal:
+    # nesse caso só o pico é zerado, e o que já estava alocado é descontado
+    iniciar_tracemalloc = usar_tracemalloc and not tracemalloc.is_tracing()
+    if iniciar_tracemalloc:
+        tracemalloc.start()
+    elif usar_tracemalloc:
+        tracemalloc.reset_peak()
+    base = tracemalloc.get_traced_memory()[0] if usar_tracemalloc else 0
+    try:
+        yield dados
+    finally:
+        if perfil:
+            perfil.disable()
+            perfil.create_stats()
+            dados["stats"] = perfil.stats
+        if usar_tracemalloc:
+            dados["pico_memoria"] = tracemalloc.get_traced_memory()[1] - base
+        if iniciar_tracemalloc:
+            tracemalloc.stop()
+
+def mesclar_perfil(nome, dados):
+    """Guarda o perfil de um worker (ver perfilar_worker) para o relatório da etapa 'nome' em andamento."""
+    if dados:
+        with _lock:
+            _perfis_workers.setdefault(nome, []).append(dados)
+
+def _gravar_cprofile(nome, perfil, stats_workers):
+    fontes = ([perfil] if perfil else []) + [_StatsWorker(s) for s in stats_workers]
+    estatisticas = pstats.Stats(*fontes)
+    estatisticas.dump_stats(_arquivo_perfil(nome, ".prof"))
+    texto = io.StringIO()
+    estatisticas.stream = texto
+    estatisticas.sort_stats("cumulative").print_stats(40)
+    with open(_arquivo_perfil(nome, "-cprofile.txt"), "w", encoding="utf-8") as f:
+        if stats_workers:
+            f.write(f"Inclui o perfil de {len(stats_workers)} tarefas executadas em workers\n")
+        f.write(texto.getvalue())
+
+def _gravar_tracemalloc(nome, memoria, picos_workers):
+    with open(_arquivo_perfil(nome, "-tracemalloc.txt"), "w", encoding="utf-8") as f:
+        if picos_workers:
+            f.write(f"Workers: {len(picos_workers)} tarefas, pico máximo {max(picos_workers) / 1024 / 1024:.2f} MB, "
+                    f"média dos picos {sum(picos_workers) / len(picos_workers) / 1024 / 1024:.2f} MB\n\n")
+        if memoria:
+            snapshot = tracemalloc.take_snapshot()
+            atual, pico = tracemalloc.get_traced_memory()
+            f.write(f"Memória atual: {atual / 1024 / 1024:.2f} MB, pico: {pico / 1024 / 1024:.2f} MB\n\n")
+            for estatistica in snapshot.statistics("lineno")[:30]:
+                f.write(f"{estatistica}\n")
+
+@contextlib.contextmanager
+def perfilar(nome):
+    """
+    Executa o bloco sob cProfile e/ou tracemalloc se a etapa estiver selecionada,
+    gravando os relatórios em PASTA_PERFIS (.prof e .txt). Perfis de workers recebidos
+    com mesclar_perfil durante o bloco entram nos mesmos relatórios. Sem seleção, não faz nada.
+    """
+    usar_cprofile, usar_tracemalloc = selecao_perfil(nome)
+    if not (usar_cprofile or usar_tracemalloc):
+        yield
+        return
+    with _lock:
+        _perfis_workers.pop(nome, None)
+    perfil = _iniciar_cprofile() if usar_cprofile else None
+    memoria = usar_tracemalloc and not tracemalloc.is_tracing()
+    if memoria:
+        tracemalloc.start(25)
+    try:
+        yield
+    finally:
+        if perfil:
+            perfil.disable()
+        with _lock:
+            workers = _perfis_workers.pop(nome, [])
+        stats_workers = [d["stats"] for d in workers if "stats" in d]
+        picos_workers = [d["pico_memoria"] for d in workers if "pico_memoria" in d]
+        if perfil or stats_workers:
+            _gravar_cprofile(nome, perfil, stats_workers)
+        if memoria or picos_workers:
+            _gravar_tracemalloc(nome, memoria, picos_workers)
+        if memoria:
+            tracemalloc.stop()
+
+@contextlib.contextmanager
+def etapa(nome, **atributos):
+    """Span de uma etapa do pipeline, com perfilamento opcional (ver perfilar)."""
+    with perfilar(nome), span(nome, **atributos) as attrs:
+        yield attrs
+
+# ----- resumo e exportação -----
+
+def duracoes(nome):
+    """Retorna a duração (s) de cada span registrado com o nome indicado."""
+    with _lock:
+        return [s["duracao"] for s in _spans if s["nome"] == nome]
+
+def _percentil(valores, p):
+    if not valores:
+        return None
+    ordenados = sorted(valores)
+    return ordenados[min(len(ordenados) - 1, int(round(p / 100.0 * (len(ordenados) - 1))))]
+
+def resumo():
+    """
+    Retorna um dicionário com, por etapa: número de spans, tempo total, p50/p95 e bytes
+    de entrada/saída; além dos contadores, medidores e taxas de acerto de cache
+    (para cada par de contadores '<x>.acertos' / '<x>.faltas').
+    """
+    with _lock:
+        spans = list(_spans)
+        contadores = dict(_contadores)
+        medidores = {k: dict(v) for k, v in _medidores.items()}
+    etapas = {}
+    for s in spans:
+        e = etapas.setdefault(s["nome"], {"n": 0, "total_s": 0.0, "duracoes": [], "bytes_entrada": 0, "bytes_saida": 0})
+        e["n"] += 1
+        e["total_s"] += s["duracao"]
+        e["duracoes"].append(s["duracao"])
+        e["bytes_entrada"] += s["atributos"].get("bytes_entrada", 0) or 0
+        e["bytes_saida"] += s["atributos"].get("bytes_saida", 0) or 0
+    for e in etapas.values():
+        duracoes = e.pop("duracoes")
+        e["p50_s"] = _percentil(duracoes, 50)
+        e["p95_s"] = _percentil(duracoes, 95)
+    taxas = {}
+    for nome, acertos in contadores.items():
+        if nome.endswith(".acertos"):
+            base = nome[:-len(".acertos")]
+            total = acertos + contadores.get(base + ".faltas", 0)
+            taxas[base] = acertos / total if total else None
+    return {"etapas": etapas, "contadores": contadores, "medidores": medidores, "taxas_acerto": taxas}
+
+def exportar_json(caminho):
+    """
+    Grava o trace no formato Trace Event (abre em chrome://tracing ou no Perfetto),
+    com o resumo das métricas na chave 'metricas'.
+    """
+    with _lock:
+        spans = list(_spans)
+    eventos = [{
+        "name": s["nome"],
+        "ph": "X",
+        "ts": s["inicio"] * 1e6,
+        "dur": s["duracao"] * 1e6,
+        "pid": s["pid"],
+        "tid": s["tid"],
+        "args": s["atributos"],
+    } for s in spans]
+    with open(caminho, "w", encoding="utf-8") as f:
+        json.dump({"traceEvents": eventos, "metricas": resumo()}, f, default=str)
+
+def _nome_prometheus(nome):
+    return "proxy_" + "".join(c if c.isalnum() else "_" for c in nome)
+
+def exportar_prometheus(caminho=None):
+    """Retorna (e opcionalmente grava) as métricas no formato texto do Prometheus."""
+    dados = resumo()
+    linhas = []
+    linhas.append("# TYPE proxy_etapa_segundos summary")
+    for nome, e in sorted(dados["etapas"].items()):
+        rotulo = f'etapa="{nome}"'
+        linhas.append(f'proxy_etapa_segundos{{{rotulo},quantile="0.5"}} {e["p50_s"]}')
+        linhas.append(f'proxy_etapa_segundos{{{rotulo},quantile="0.95"}} {e["p95_s"]}')
+        linhas.append(f'proxy_etapa_segundos_sum{{{rotulo}}} {e["total_s"]}')
+        linhas.append(f'proxy_etapa_segundos_count{{{rotulo}}} {e["n"]}')
+    linhas.append("# TYPE proxy_etapa_bytes_total counter")
+    for nome, e in sorted(dados["etapas"].items()):
+        linhas.append(f'proxy_etapa_bytes_total{{etapa="{nome}",direcao="entrada"}} {e["bytes_entrada"]}')
+        linhas.append(f'proxy_etapa_bytes_total{{etapa="{nome}",direcao="saida"}} {e["bytes_saida"]}')
+    for nome, valor in sorted(dados["contadores"].items()):
+        metrica = _nome_prometheus(nome) + "_total"
+        linhas.append(f"# TYPE {metrica} counter")
+        linhas.append(f"{metrica} {valor}")
+    for nome, valor in sorted(dados["medidores"].items()):
+        metrica = _nome_prometheus(nome)
+        linhas.append(f"# TYPE {metrica} gauge")
+        linhas.append(f"{metrica} {valor['atual']}")
+        linhas.append(f"{metrica}_max {valor['maximo']}")
+    texto = "\n".join(linhas) + "\n"
+    if caminho:
+        with open(caminho, "w", encoding="utf-8") as f:
+            f.write(texto)
+    return texto